@@ -0,0 +1,196 @@
+# benchmark.py
+# 단계별 지연 벤치마크 (LLM 은 fake_llm 으로 대체해서 네트워크 없이 측정)
+#   python benchmark.py                                  # SCENARIOS x 3회
+#   python benchmark.py --workload queries.jsonl -n 500 --llm-latency 0.3 -o bench.json
+import argparse
+import json
+import subprocess
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import rag_llm
+from fake_llm import FakeChatModel
+from rag_pipeline import (
+    parse_ingredients, rank_docs, raw_menu_title, detect_language,
+    make_witty_titles, merge_index_candidates, needs_index_candidates, recipe_prompt, FILTER_START_K,
+)
+from retriever import filtered_search, get_vectorstore
+from context_builder import count_tokens
+import resources
+
+STAGES = [
+    "query_embedding", "vector_search", "filtered_search", "index_merge", "ranking",
+    "title_generation", "prompt_assembly", "recipe_ttft", "recipe_total",
+]
+
+def load_queries(workload: str = None, n: int = None, repeat: int = 3) -> List[Dict]:
+    if workload:
+        from workload import read_jsonl
+        rows = list(read_jsonl(workload))
+    else:
+        from eval_scenarios import SCENARIOS
+        rows = [dict(sc) for sc in SCENARIOS] * repeat
+    return rows[:n] if n else rows
+
+def _ms(t0: float) -> float:
+    return (time.perf_counter() - t0) * 1000.0
+
+def run_query(q: Dict, title_mode: str, use_embed_cache: bool, token_budget: int = None) -> Dict:
+    story = q.get("story") or q["query"]
+    ingredients = q.get("ingredients", "")
+    style = q.get("style", "")
+    user_ings = parse_ingredients(ingredients)
+    query = f"User mood: {story}\nIngredients: {ingredients}\nStyle: {style}\nFind suitable Korean recipes.\nBeginner friendly."
+    out = {}
+
+    emb = resources.get_embedding()
+    t0 = time.perf_counter()
+    vec = emb.embed_query(query) if use_embed_cache else emb.base.embed_query(query)
+    out["query_embedding"] = _ms(t0)
+
+    t0 = time.perf_counter()
+    get_vectorstore().similarity_search_by_vector(vec, k=FILTER_START_K)
+    out["vector_search"] = _ms(t0)
+
+    # filtered_search 는 (캐시된) 쿼리 임베딩 + 재료 필터 ANN 검색 최대 몇 라운드까지 포함
+    t0 = time.perf_counter()
+    docs, info = filtered_search(query, user_ings, min_results=5)
+    out["filtered_search"] = _ms(t0)
+
+    t0 = time.perf_counter()
+    if needs_index_candidates(docs, info):
+        docs = merge_index_candidates(docs, user_ings)
+    out["index_merge"] = _ms(t0)
+    out["candidates"] = len(docs)
+    out["search_rounds"] = info["rounds"]
+
+    t0 = time.perf_counter()
+    top = rank_docs(docs, user_ings, style, top_k=5)
+    out["ranking"] = _ms(t0)
+
+    t0 = time.perf_counter()
+    raw_titles = [raw_menu_title(d) for _, d, _ in top]
+    make_witty_titles(raw_titles, story, detect_language(story), mode=title_mode)
+    out["title_generation"] = _ms(t0)
+
+    picked = raw_titles[0] if raw_titles else "임의 메뉴"
+    picked_id = str((top[0][1].metadata or {}).get("id", "")) if top else ""
+    t0 = time.perf_counter()
+    prompt, _ = recipe_prompt(story, ingredients, picked, selected_recipe_id=picked_id,
+                              token_budget=token_budget)
+    out["prompt_assembly"] = _ms(t0)
+    out["prompt_chars"] = len(prompt)
+    out["prompt_tokens"] = count_tokens(prompt)
+
+    t0 = time.perf_counter()
+    ttft = None
+    tokens = 0
+    for _ in rag_llm.llm_chat_stream(prompt):
+        if ttft is None:
+            ttft = _ms(t0)
+        tokens += 1
+    total = _ms(t0)
+    out["recipe_ttft"] = ttft if ttft is not None else total
+    out["recipe_total"] = total
+    out["recipe_tokens"] = tokens
+    gen_s = (total - out["recipe_ttft"]) / 1000.0
+    out["tokens_per_sec"] = (tokens - 1) / gen_s if tokens > 1 and gen_s > 0 else 0.0
+    return out
+
+def summarize(values: List[float]) -> Dict:
+    a = np.asarray(values, dtype=float)
+    if a.size == 0:
+        return {}
+    return {
+        "mean": round(float(a.mean()), 3),
+        "p50": round(float(np.percentile(a, 50)), 3),
+        "p95": round(float(np.percentile(a, 95)), 3),
+        "p99": round(float(np.percentile(a, 99)), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+def run_benchmark(queries: List[Dict], llm_latency: float = 0.2, token_latency: float = 0.01,
+                  tokens: int = 120, title_mode: str = "concurrent", use_embed_cache: bool = True,
+                  warm_up: bool = True, token_budget: int = None) -> Dict:
+    rag_llm.set_llm(FakeChatModel(latency=llm_latency, token_latency=token_latency, tokens=tokens))
+    # 제목 캐시가 반복 쿼리 지연을 가리지 않도록, 디스크 캐시도 건드리지 않도록 끔
+    rag_llm.llm_cache = rag_llm.LLMCache(path=None, mem_size=0)
+    if warm_up:
+        resources.warm_up(background=False)
+
+    rows = []
+    t0 = time.perf_counter()
+    for q in queries:
+        rows.append(run_query(q, title_mode, use_embed_cache, token_budget))
+    wall = time.perf_counter() - t0
+
+    return {
+        "commit": git_commit(),
+        "config": {
+            "queries": len(queries), "llm_latency": llm_latency, "token_latency": token_latency,
+            "tokens": tokens, "title_mode": title_mode, "embed_cache": use_embed_cache,
+            "token_budget": token_budget,
+        },
+        "stages_ms": {s: summarize([r[s] for r in rows]) for s in STAGES},
+        "tokens_per_sec": summarize([r["tokens_per_sec"] for r in rows]),
+        "candidates": summarize([r["candidates"] for r in rows]),
+        "prompt_chars": summarize([r["prompt_chars"] for r in rows]),
+        "prompt_tokens": summarize([r["prompt_tokens"] for r in rows]),
+        "throughput_qps": round(len(rows) / wall, 3) if wall > 0 else 0.0,
+        "wall_seconds": round(wall, 3),
+    }
+
+def print_report(result: Dict):
+    print(f"\n===== BENCHMARK ({result['commit'] or 'no-git'}) =====")
+    print(f"{'stage':<20} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for s, st in result["stages_ms"].items():
+        if st:
+            print(f"{s:<20} {st['p50']:>9.2f} {st['p95']:>9.2f} {st['p99']:>9.2f}")
+    print(f"tokens/sec p50: {result['tokens_per_sec'].get('p50', 0):.1f}")
+    pt = result["prompt_tokens"]
+    if pt:
+        print(f"prompt tokens p50/p95/max: {pt['p50']:.0f} / {pt['p95']:.0f} / {pt['max']:.0f}")
+    print(f"throughput: {result['throughput_qps']:.2f} queries/sec  "
+          f"({result['config']['queries']} queries, {result['wall_seconds']:.1f}s)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workload", help="workload.py 로 만든 JSONL (없으면 SCENARIOS)")
+    parser.add_argument("-n", type=int, default=None, help="쿼리 수 제한")
+    parser.add_argument("--repeat", type=int, default=3, help="SCENARIOS 반복 횟수")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM 첫 응답 지연(초)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="fake LLM 토큰 간 지연(초)")
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--title-mode", default="concurrent")
+    parser.add_argument("--no-embed-cache", action="store_true")
+    parser.add_argument("--token-budget", type=int, default=None,
+                        help="레시피 context 토큰 예산 (0 이면 예산 없이 예전 프롬프트)")
+    parser.add_argument("-o", "--out", default="benchmark_result.json")
+    args = parser.parse_args()
+
+    queries = load_queries(args.workload, args.n, args.repeat)
+    result = run_benchmark(
+        queries,
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+        title_mode=args.title_mode,
+        use_embed_cache=not args.no_embed_cache,
+        token_budget=args.token_budget,
+    )
+    print_report(result)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"saved: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,35 @@
 #----------------------------------------------------------------------------------------------------------------------------
 
 # build_vector_db.py
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
 from langchain.docstore.document import Document
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 
+from ingredient_index import build_inverted_index, save_index, INDEX_PATH
+from hybrid_retriever import BM25Index, BM25_PATH
+from features import precompute_features
+from recipe_store import save_documents, RECIPE_STORE_PATH
+from faiss_store import FaissWriter, FAISS_DIR, INDEX_TYPES, DEFAULT_INDEX_TYPE
+from resources import create_embedding, EMBED_ENCODERS
+
 CSV_PATH = "final_preview.csv"    
 PERSIST_DIR = "./chroma_db"
 EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+UPSERT_BATCH = 256
+DEDUP_THRESHOLD = 0.95   # 같은 요리명 안에서 이 cosine 이상이면 같은 레시피 변형으로 봄
+# --dedup 때 모든 행(스토어에 안 들어가는 변형 포함)의 벡터, (encoder, content_hash) 기준
+DEDUP_VECTORS_PATH = "./dedup_vectors.sqlite"
 
 def safe_str(x):
     return "" if pd.isna(x) else str(x)
@@ -32,11 +53,12 @@ def build_documents(df: pd.DataFrame):
         ).strip()
 
         # ===== Metadata (정렬/필터용) =====
+        views = int(row["조회수"]) if not pd.isna(row["조회수"]) else 0
         metadata = {
             "id": int(row["레시피일련번호"]) if not pd.isna(row["레시피일련번호"]) else None,
             "menu": safe_str(row["요리명"]),
             "title": safe_str(row["레시피제목"]),
-            "views": int(row["조회수"]) if not pd.isna(row["조회수"]) else 0,
+            "views": views,
             "level": safe_str(row["난이도"]),
             "method": safe_str(row["조리방법"]),
             "situation": safe_str(row["상황별분류"]),
@@ -44,10 +66,279 @@ def build_documents(df: pd.DataFrame):
             "serving": safe_str(row["인분"]),
         }
 
+        # ===== 랭킹 피처 (쿼리 때 다시 파싱하지 않도록 미리 계산) =====
+        metadata.update(precompute_features(
+            safe_str(row["난이도"]), views, safe_str(row["조리시간"]), safe_str(row["재료내용"])
+        ))
+
+        # ===== 증분 빌드용 내용 해시 =====
+        metadata["content_hash"] = content_hash(page_content, metadata)
+
         docs.append(Document(page_content=page_content, metadata=metadata))
     return docs
 
-def main():
+def content_hash(page_content: str, metadata: dict) -> str:
+    payload = json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{page_content}\x00{payload}".encode("utf-8")).hexdigest()
+
+def doc_id(doc) -> str:
+    # 레시피일련번호가 Chroma id (없으면 내용 해시)
+    rid = doc.metadata.get("id")
+    return str(rid) if rid is not None else doc.metadata["content_hash"]
+
+# ---------------------------
+# Incremental build (새로 생기거나 바뀐 행만 임베딩, 사라진 행은 삭제)
+# ---------------------------
+def existing_hashes(db) -> dict:
+    res = db.get(include=["metadatas"])
+    return {
+        i: (md or {}).get("content_hash")
+        for i, md in zip(res.get("ids") or [], res.get("metadatas") or [])
+    }
+
+def incremental_upsert(db, documents, batch_size: int = UPSERT_BATCH, add_fn=None) -> dict:
+    """
+    Chroma 에 저장된 content_hash 가 곧 체크포인트.
+    배치마다 바로 저장되므로 중간에 끊겨도 다시 돌리면 남은 것부터 이어서 진행.
+    """
+    current = existing_hashes(db)
+    wanted = {doc_id(d): d for d in documents}
+
+    todo = [i for i, d in wanted.items() if current.get(i) != d.metadata["content_hash"]]
+    gone = [i for i in current if i not in wanted]
+    stats = {"total": len(wanted), "unchanged": len(wanted) - len(todo),
+             "upserted": 0, "deleted": 0}
+    print(f"Incremental: {len(todo)} to embed, {len(gone)} to delete, {stats['unchanged']} unchanged")
+
+    if add_fn is not None:
+        # 병렬 임베딩 writer 는 upsert 라서 삭제 없이 한 번에 넘김
+        add_fn([wanted[i] for i in todo], todo)
+        stats["upserted"] = len(todo)
+    else:
+        for start in range(0, len(todo), batch_size):
+            ids = todo[start:start + batch_size]
+            stale = [i for i in ids if i in current]
+            if stale:
+                db.delete(ids=stale)
+            db.add_documents([wanted[i] for i in ids], ids=ids)
+            stats["upserted"] += len(ids)
+            print(f"  upserted {stats['upserted']}/{len(todo)}")
+
+    for start in range(0, len(gone), batch_size):
+        ids = gone[start:start + batch_size]
+        db.delete(ids=ids)
+        stats["deleted"] += len(ids)
+
+    return stats
+
+# ---------------------------
+# Multi-process embedding (워커마다 모델 1개, writer 는 메인 프로세스 하나)
+# ---------------------------
+_worker_embedding = None
+
+def _init_worker(model_name: str, batch_size: int, threads: int, encoder: str):
+    global _worker_embedding
+    _worker_embedding = create_embedding(model_name, encoder, threads=max(1, threads),
+                                         batch_size=batch_size)
+
+def _embed_chunk(texts):
+    return _worker_embedding.embed_documents(texts)
+
+def embed_parallel(texts, workers: int = 2, batch_size: int = 64, threads: int = 1,
+                   encoder: str = "torch"):
+    """texts: 청크 목록. 청크 순서대로 벡터 목록을 yield."""
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(EMBED_MODEL, batch_size, threads, encoder)) as pool:
+        # imap 은 순서를 유지하므로 벡터와 문서를 그대로 짝지을 수 있음
+        yield from pool.imap(_embed_chunk, texts)
+
+def add_documents_parallel(db, documents, ids, workers: int = 2, batch_size: int = 64,
+                           threads: int = 1, chunk_size: int = UPSERT_BATCH, upsert=None,
+                           encoder: str = "torch") -> dict:
+    # upsert: (ids, embeddings, documents, metadatas) 를 받는 writer (기본은 Chroma collection)
+    upsert = upsert or db._collection.upsert
+    chunks = [
+        (ids[i:i + chunk_size], documents[i:i + chunk_size])
+        for i in range(0, len(documents), chunk_size)
+    ]
+    texts = [[d.page_content for d in docs] for _, docs in chunks]
+
+    start = time.perf_counter()
+    done = 0
+    vector_iter = embed_parallel(texts, workers, batch_size, threads, encoder)
+    for (chunk_ids, docs), vectors in zip(chunks, vector_iter):
+        upsert(
+            ids=chunk_ids,
+            embeddings=vectors,
+            documents=[d.page_content for d in docs],
+            metadatas=[d.metadata for d in docs],
+        )
+        done += len(docs)
+        elapsed = time.perf_counter() - start
+        print(f"  embedded {done}/{len(documents)}  ({done / elapsed:.1f} docs/sec)")
+
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"Parallel embedding: {done} docs in {elapsed:.1f}s  ({rate:.1f} docs/sec, "
+          f"workers={workers}, batch_size={batch_size}, threads={threads}, encoder={encoder})")
+    return {"docs": done, "seconds": elapsed, "docs_per_sec": rate}
+
+# ---------------------------
+# Near-duplicate collapsing (같은 요리명 + 임베딩이 거의 같은 레시피는 대표 1개만 색인)
+# ---------------------------
+def embed_all(documents, embedding, workers: int = 0, batch_size: int = 64, threads: int = 1,
+              encoder: str = "torch") -> np.ndarray:
+    texts = [d.page_content for d in documents]
+    chunks = [texts[i:i + UPSERT_BATCH] for i in range(0, len(texts), UPSERT_BATCH)]
+    if workers > 0:
+        vector_iter = embed_parallel(chunks, workers, batch_size, threads, encoder)
+    else:
+        vector_iter = (embedding.embed_documents(c) for c in chunks)
+    out = []
+    for vectors in vector_iter:
+        out.extend(vectors)
+        print(f"  embedded {len(out)}/{len(texts)}")
+    return np.asarray(out, dtype=np.float32)
+
+def stored_vectors(db) -> dict:
+    """
+    id -> (임베딩한 행의 content_hash, 벡터).
+    묶인 대표는 metadata 가 바뀌어 content_hash 가 달라지므로 원래 행 해시(source_hash)로 비교.
+    """
+    res = db.get(include=["metadatas", "embeddings"])
+    embeddings = res.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {
+        i: ((md or {}).get("source_hash") or (md or {}).get("content_hash"),
+            np.asarray(v, dtype=np.float32))
+        for i, md, v in zip(res.get("ids") or [], res.get("metadatas") or [], embeddings)
+    }
+
+def load_row_vectors(encoder: str, path: str = DEDUP_VECTORS_PATH) -> dict:
+    """content_hash -> 벡터 (같은 인코더로 만든 것만)"""
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    rows = conn.execute("SELECT content_hash, vector FROM row_vector WHERE encoder = ?", (encoder,)).fetchall()
+    conn.close()
+    return {h: np.frombuffer(v, dtype=np.float32) for h, v in rows}
+
+def save_row_vectors(documents, vectors: np.ndarray, encoder: str, path: str = DEDUP_VECTORS_PATH):
+    # 이번 CSV 의 행만 남기고 통째로 교체 (사라진 행 / 다른 인코더 벡터는 정리됨)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute("CREATE TABLE row_vector (encoder TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                 "vector BLOB NOT NULL, PRIMARY KEY (encoder, content_hash))")
+    conn.executemany(
+        "INSERT OR REPLACE INTO row_vector (encoder, content_hash, vector) VALUES (?, ?, ?)",
+        ((encoder, d.metadata["content_hash"], np.asarray(v, dtype=np.float32).tobytes())
+         for d, v in zip(documents, vectors)),
+    )
+    conn.commit()
+    conn.close()
+    os.replace(tmp, path)
+
+def embed_changed(documents, stored: dict, embedding, workers: int = 0, batch_size: int = 64,
+                  threads: int = 1, encoder: str = "torch", cached: dict = None) -> np.ndarray:
+    """
+    content_hash 가 그대로인 행은 저장된 벡터를 쓰고, 새로 생기거나 바뀐 행만 임베딩.
+    stored: 스토어의 id -> (content_hash, 벡터), cached: 사이드카의 content_hash -> 벡터 (변형 포함)
+    """
+    cached = cached or {}
+    vectors = [None] * len(documents)
+    todo = []
+    for k, d in enumerate(documents):
+        h = d.metadata["content_hash"]
+        hit = stored.get(doc_id(d))
+        if hit is not None and hit[0] == h:
+            vectors[k] = hit[1]
+        elif h in cached:
+            vectors[k] = cached[h]
+        else:
+            todo.append(k)
+    print(f"Dedup embedding: {len(todo)} to embed, {len(documents) - len(todo)} reused")
+    if todo:
+        fresh = embed_all([documents[k] for k in todo], embedding, workers, batch_size, threads, encoder)
+        for k, v in zip(todo, fresh):
+            vectors[k] = v
+    return np.asarray(np.stack(vectors), dtype=np.float32)
+
+def dish_key(menu: str) -> str:
+    return re.sub(r"\s+", "", menu or "").lower()
+
+def collapse_near_duplicates(documents, vectors: np.ndarray, threshold: float = DEDUP_THRESHOLD):
+    """
+    요리명이 같은 문서끼리 조회수 높은 순으로 보면서, 이미 뽑힌 대표와 cosine >= threshold 면
+    그 대표의 변형으로 묶음. 대표 metadata 에 variant_ids / variant_count 기록.
+    반환: (대표 문서, 대표 벡터, 통계)
+    """
+    unit = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    groups = defaultdict(list)
+    for i, d in enumerate(documents):
+        key = dish_key(d.metadata.get("menu"))
+        # 요리명이 없으면 묶지 않음
+        groups[key if key else ("", i)].append(i)
+
+    variants = {}   # 대표 index -> 변형 index 목록
+    for members in groups.values():
+        members.sort(key=lambda i: (-int(documents[i].metadata.get("views") or 0), i))
+        reps = []
+        for i in members:
+            if reps:
+                sims = unit[reps] @ unit[i]
+                best = int(np.argmax(sims))
+                if sims[best] >= threshold:
+                    variants[reps[best]].append(i)
+                    continue
+            reps.append(i)
+            variants[i] = []
+
+    keep = sorted(variants)
+    kept_docs = []
+    for i in keep:
+        d = documents[i]
+        md = {k: v for k, v in d.metadata.items() if k != "content_hash"}
+        # Chroma 메타데이터는 스칼라만 되므로 콤마 문자열
+        md["variant_ids"] = ",".join(str(documents[j].metadata.get("id")) for j in variants[i])
+        md["variant_count"] = len(variants[i])
+        md["source_hash"] = d.metadata["content_hash"]
+        md["content_hash"] = content_hash(d.page_content, md)
+        kept_docs.append(Document(page_content=d.page_content, metadata=md))
+
+    sizes = [len(v) + 1 for v in variants.values()]
+    stats = {
+        "before": len(documents),
+        "after": len(kept_docs),
+        "removed": len(documents) - len(kept_docs),
+        "shrink": round(1.0 - len(kept_docs) / len(documents), 4) if documents else 0.0,
+        "dishes": len(groups),
+        "clusters_with_variants": sum(1 for n in sizes if n > 1),
+        "largest_cluster": max(sizes) if sizes else 0,
+        "vector_mb_before": round(vectors.nbytes / 1e6, 2),
+        "vector_mb_after": round(vectors[keep].nbytes / 1e6, 2),
+    }
+    return kept_docs, vectors[keep], stats
+
+def clear_chroma(embedding, path: str = PERSIST_DIR):
+    # Chroma 는 기존 컬렉션에 이어서 쓰므로, 전체 재빌드 전에 지워야 CSV 에서 빠진 행 /
+    # 예전 uuid id 로 들어간 행이 남지 않음 (디렉터리 삭제는 열려 있는 chromadb 클라이언트를 깨뜨림)
+    Chroma(persist_directory=path, embedding_function=embedding).delete_collection()
+
+def open_db(backend: str, embedding, index_type: str = DEFAULT_INDEX_TYPE, fresh: bool = False):
+    if backend == "faiss":
+        return FaissWriter(FAISS_DIR, embedding_function=embedding, index_type=index_type, fresh=fresh)
+    if fresh:
+        clear_chroma(embedding, PERSIST_DIR)
+    return Chroma(persist_directory=PERSIST_DIR, embedding_function=embedding)
+
+def main(incremental: bool = False, workers: int = 0, batch_size: int = 64, threads: int = 1,
+         backend: str = "chroma", index_type: str = DEFAULT_INDEX_TYPE, encoder: str = "torch",
+         dedup: bool = False, dedup_threshold: float = DEDUP_THRESHOLD):
     df = pd.read_csv(CSV_PATH)
 
  
@@ -57,21 +348,125 @@ def main():
     if missing:
         raise ValueError(f"CSV missing columns: {missing}")
 
+    # 같은 레시피일련번호가 여러 번 나오면 마지막 행만 사용 (ID 없는 행은 서로 다른 행이므로 전부 유지)
+    ids = df["레시피일련번호"]
+    df = df[ids.isna() | ~df.duplicated(subset=["레시피일련번호"], keep="last")].reset_index(drop=True)
+
     documents = build_documents(df)
     print(f"Documents ready: {len(documents)}")
+    ing_text = dict(zip((d.metadata["id"] for d in documents), df["재료내용"].map(safe_str)))
+
+    # 쿼리 쪽 EMBED_ENCODER 와 같은 인코더로 빌드해야 벡터 공간이 정확히 맞음
+    embedding = create_embedding(EMBED_MODEL, encoder)
+
+    add_fn = None
+    if workers > 0:
+        def add_fn(docs, ids):
+            add_documents_parallel(db, docs, ids, workers=workers,
+                                   batch_size=batch_size, threads=threads,
+                                   upsert=db.upsert if backend == "faiss" else None,
+                                   encoder=encoder)
 
-    embedding = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    out_dir = FAISS_DIR if backend == "faiss" else PERSIST_DIR
+    # 색인(벡터 / 재료 역색인 / BM25)에 들어갈 문서. 레시피 저장소는 변형까지 전부 저장.
+    index_docs = documents
+    if dedup:
+        # 묶으려면 전체 벡터가 먼저 필요. 증분이면 저장된 벡터를 재사용하고 바뀐 행만 임베딩
+        # (변형으로 빠져 스토어에 없는 행은 DEDUP_VECTORS_PATH 사이드카에서 가져옴)
+        db = open_db(backend, embedding, index_type, fresh=not incremental)
+        stored = stored_vectors(db) if incremental else {}
+        cached = load_row_vectors(encoder) if incremental else {}
+        vectors = embed_changed(documents, stored, embedding, workers, batch_size, threads, encoder,
+                                cached=cached)
+        save_row_vectors(documents, vectors, encoder)
+        index_docs, kept_vectors, dstats = collapse_near_duplicates(documents, vectors, dedup_threshold)
+        print(f"Dedup: {dstats['before']} → {dstats['after']} docs "
+              f"(-{dstats['removed']}, {dstats['shrink']:.1%} smaller, "
+              f"{dstats['vector_mb_before']} MB → {dstats['vector_mb_after']} MB vectors, "
+              f"largest cluster={dstats['largest_cluster']}, threshold={dedup_threshold})")
+        vec_by_id = {doc_id(d): v.tolist() for d, v in zip(index_docs, kept_vectors)}
 
-    db = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding,
-        persist_directory=PERSIST_DIR
+        upsert = db.upsert if backend == "faiss" else db._collection.upsert
+
+        def write_precomputed(docs, ids):
+            for start in range(0, len(ids), UPSERT_BATCH):
+                chunk = ids[start:start + UPSERT_BATCH]
+                part = docs[start:start + UPSERT_BATCH]
+                upsert(ids=chunk, embeddings=[vec_by_id[i] for i in chunk],
+                       documents=[d.page_content for d in part],
+                       metadatas=[d.metadata for d in part])
+
+        # 묶여서 빠진 변형은 기존 스토어에서 삭제되도록 증분 경로로 반영
+        stats = incremental_upsert(db, index_docs, add_fn=write_precomputed)
+        db.persist()
+        print(f"Vector DB built (deduped): {out_dir}  {stats}")
+    elif incremental:
+        db = open_db(backend, embedding, index_type)
+        stats = incremental_upsert(db, documents, add_fn=add_fn)
+        db.persist()
+        print(f"Vector DB updated: {out_dir}  {stats}")
+    elif add_fn is not None:
+        db = open_db(backend, embedding, index_type, fresh=True)
+        add_fn(documents, [doc_id(d) for d in documents])
+        db.persist()
+        print(f"Vector DB built & persisted: {out_dir}  (N={len(documents)})")
+    elif backend == "faiss":
+        db = open_db(backend, embedding, index_type, fresh=True)
+        for start in range(0, len(documents), UPSERT_BATCH):
+            batch = documents[start:start + UPSERT_BATCH]
+            db.add_documents(batch, ids=[doc_id(d) for d in batch])
+        db.persist()
+        print(f"FAISS index built & persisted: {out_dir}  (N={len(documents)}, type={index_type})")
+    else:
+        clear_chroma(embedding, PERSIST_DIR)
+        db = Chroma.from_documents(
+            documents=documents,
+            embedding=embedding,
+            ids=[doc_id(d) for d in documents],
+            persist_directory=PERSIST_DIR
+        )
+        db.persist()
+        print(f"Vector DB built & persisted: {PERSIST_DIR}  (N={len(documents)})")
+
+    # ===== 재료 역색인 (재료 → 레시피ID) =====
+    ing_index = build_inverted_index(
+        (d.metadata["id"], ing_text.get(d.metadata["id"], "")) for d in index_docs
     )
-    db.persist()
-    print(f"Vector DB built & persisted: {PERSIST_DIR}  (N={len(documents)})")
+    save_index(ing_index, views={d.metadata["id"]: d.metadata["views"]
+                                 for d in index_docs if d.metadata.get("id") is not None})
+    print(f"Ingredient index saved: {INDEX_PATH}  (ingredients={len(ing_index)})")
+
+    # ===== 레시피ID → 문서 (recipe_stream 에서 검색 없이 바로 조회) =====
+    save_documents(documents)
+    print(f"Recipe store saved: {RECIPE_STORE_PATH}")
+
+    # ===== BM25 어휘 색인 (하이브리드 검색용) =====
+    BM25Index(index_docs).save(BM25_PATH)
+    print(f"BM25 index saved: {BM25_PATH}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help="기존 chroma_db 에 바뀐 행만 반영 (중단돼도 재실행하면 이어서 진행)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="임베딩 워커 프로세스 수 (0 이면 단일 프로세스)")
+    parser.add_argument("--batch-size", type=int, default=64, help="워커별 임베딩 배치 크기")
+    parser.add_argument("--threads", type=int, default=1, help="워커별 torch 스레드 수")
+    parser.add_argument("--backend", choices=["chroma", "faiss"], default="chroma",
+                        help="벡터 스토어 (faiss 는 VECTOR_BACKEND=faiss 로 조회)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=DEFAULT_INDEX_TYPE,
+                        help="faiss 인덱스 종류")
+    parser.add_argument("--encoder", choices=EMBED_ENCODERS, default="torch",
+                        help="문서 임베딩 인코더 (onnx-int8 은 onnx_encoder.py export 결과 사용)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="같은 요리명의 거의 같은 레시피는 조회수 높은 대표 1개만 색인")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="대표와 묶을 최소 cosine 유사도")
+    args = parser.parse_args()
+    main(incremental=args.incremental, workers=args.workers,
+         batch_size=args.batch_size, threads=args.threads,
+         backend=args.backend, index_type=args.index_type, encoder=args.encoder,
+         dedup=args.dedup, dedup_threshold=args.dedup_threshold)
 
 
 
@@ -0,0 +1,153 @@
+# context_builder.py
+# 레시피 프롬프트용 context 를 토큰 예산 안에서 조립
+#   선택한 레시피를 먼저, 필요한 필드만, 겹치는 재료는 한 번만, 남는 건 잘라서 예산에 맞춤
+# 토큰 수는 tiktoken (requirements.txt) 으로 셈. 없으면 한글 1글자 ≈ 1토큰 / 그 외 4글자 ≈ 1토큰
+# 추정으로 대신하는데, 실제보다 대체로 많게 잡혀서 예산을 덜 채움
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ingredient_index import ingredient_words, normalize_ingredient, split_ingredient_items
+
+RECIPE_TOKEN_BUDGET = int(os.environ.get("RAG_RECIPE_TOKEN_BUDGET", "600"))  # context 에 쓸 최대 토큰
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+# 선택한 레시피 / 비슷한 레시피에서 남길 필드 (page_content 의 "필드: 값" 줄)
+PICKED_FIELDS = ["요리명", "레시피제목", "조리방법", "재료내용", "레시피소개"]
+SIMILAR_FIELDS = ["요리명", "조리방법", "재료내용"]
+# build_vector_df.build_documents 가 page_content 에 쓰는 필드 순서
+PAGE_FIELDS = ["요리명", "레시피제목", "상황별분류", "조리방법", "레시피소개", "재료내용"]
+INTRO_MAX_TOKENS = 60       # 레시피소개는 길어서 따로 상한
+SIMILAR_MIN_TOKENS = 24     # 이보다 적게 남으면 비슷한 레시피는 생략
+
+# ---------------------------
+# Token counting (tiktoken 없으면 대략 추정)
+# ---------------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+_HANGUL = re.compile(r"[가-힣]")
+# 알려진 필드 이름으로 시작하는 줄만 새 필드로 봄 (값 안의 ':' / 여러 줄 값은 그대로 유지)
+_FIELD_START = re.compile(r"^(%s):[ \t]*" % "|".join(map(re.escape, PAGE_FIELDS)), re.M)
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    # 한글은 글자당 ~1 토큰, 나머지는 ~4글자당 1 토큰
+    hangul = len(_HANGUL.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    enc = _encoding()
+    if enc is not None:
+        cut = enc.decode(enc.encode(text)[:max(0, max_tokens - 1)])
+    else:
+        # 추정치 기준으로 줄여나감
+        cut = text
+        while cut and count_tokens(cut + "…") > max_tokens:
+            cut = cut[: int(len(cut) * 0.9)]
+    return cut.rstrip() + "…"
+
+# ---------------------------
+# Fields
+# ---------------------------
+def parse_fields(page_content: str) -> Dict[str, str]:
+    """'요리명: 김치찌개\\n재료내용: ...' → {'요리명': '김치찌개', ...} (값은 다음 필드 전까지 전부)"""
+    text = page_content or ""
+    fields = {}
+    matches = list(_FIELD_START.finditer(text))
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        end = nxt.start() if nxt else len(text)
+        fields[m.group(1)] = text[m.end():end].strip()
+    return fields
+
+def ingredient_items(text: str) -> List[Tuple[str, str]]:
+    """재료내용 → [(정규화 이름, 원문 항목)] (양 표기는 원문에 남김)"""
+    items = []
+    # '/' 로는 안 나눔 ('김치 1/4포기' 의 양 표기를 살려야 해서)
+    for raw in split_ingredient_items(text):
+        words = ingredient_words(raw)
+        if words:
+            # '두부 반모' / '돼지고기 앞다리살' / '다진 마늘' 은 (수식어 뺀) 첫 단어로 비교
+            items.append((normalize_ingredient(words[0]), raw))
+    return items
+
+def remember_ingredients(text: str, seen: set):
+    for key, _ in ingredient_items(text):
+        seen.add(key)
+
+def dedupe_ingredients(text: str, seen: set) -> str:
+    """seen 에 없는 재료만 남기고 seen 갱신"""
+    kept = []
+    for key, raw in ingredient_items(text):
+        if key not in seen:
+            seen.add(key)
+            kept.append(raw)
+    return ", ".join(kept)
+
+def _render(fields: Dict[str, str], order: List[str]) -> str:
+    return "\n".join(f"{k}: {fields[k]}" for k in order if fields.get(k))
+
+# ---------------------------
+# Builder
+# ---------------------------
+def build_context(docs: List, budget: Optional[int] = None) -> Tuple[str, Dict]:
+    """
+    docs[0] 이 선택한(또는 가장 가까운) 레시피. 나머지는 예산이 남을 때만 붙임.
+    반환: (context, info{context_tokens, budget, docs_used, truncated, raw_tokens})
+    """
+    budget = RECIPE_TOKEN_BUDGET if budget is None else budget
+    seen: set = set()
+    blocks: List[str] = []
+    used = 0
+    truncated = 0
+
+    for i, d in enumerate(docs):
+        fields = parse_fields(d.page_content)
+        if i == 0:
+            # 선택한 레시피의 재료는 양 / [재료]·[양념] 구분까지 원문 그대로
+            remember_ingredients(fields.get("재료내용", ""), seen)
+            intro = fields.get("레시피소개", "")
+            short = truncate_tokens(intro, INTRO_MAX_TOKENS)
+            truncated += short != intro
+            fields["레시피소개"] = short
+            block = _render(fields, PICKED_FIELDS)
+        else:
+            if budget - used < SIMILAR_MIN_TOKENS:
+                break
+            fields["재료내용"] = dedupe_ingredients(fields.get("재료내용", ""), seen)
+            block = "[비슷한 레시피]\n" + _render(fields, SIMILAR_FIELDS)
+
+        remaining = budget - used - (2 if blocks else 0)
+        if count_tokens(block) > remaining:
+            block = truncate_tokens(block, remaining)
+            truncated += 1
+        if not block:
+            break
+        blocks.append(block)
+        used = count_tokens("\n\n".join(blocks))
+
+    context = "\n\n".join(blocks)
+    return context, {
+        "context_tokens": count_tokens(context),
+        "raw_tokens": count_tokens("\n\n".join(d.page_content for d in docs)),
+        "budget": budget,
+        "docs_used": len(blocks),
+        "truncated": truncated,
+    }
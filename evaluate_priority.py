@@ -1,27 +1,42 @@
+# evaluate_priority.py
+#   python evaluate_priority.py                       # LLM 없이, 스레드 8개
+#   python evaluate_priority.py --backend process -w 4
+#   python evaluate_priority.py --with-titles         # 예전처럼 제목 LLM 호출까지 포함
+import argparse
+import multiprocessing as mp
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import numpy as np
 from rag_pipeline import suggest_menus
-from retriever import retriever
+from retriever import get_retriever
 
 N_TEST = 1000
 TOP_K = 5
+SEED = 42
 
 # ------------------------------
 # 자동 재료 샘플러 (DB에서 추출)
 # ------------------------------
-def sample_ingredients_from_db():
-    docs = retriever.invoke("재료")
+def build_ingredient_vocab():
+    # 샘플링 후보는 한 번만 만들고 모든 반복에서 재사용
+    docs = get_retriever(30).invoke("재료")
     texts = " ".join(d.page_content for d in docs)
 
     candidates = []
     for token in texts.split():
         if len(token) >= 2 and token.isalpha():
             candidates.append(token)
+    return candidates
 
-    if not candidates:
+def sample_ingredients(vocab, rng: random.Random):
+    if not vocab:
         return ["김치"]
+    return rng.sample(vocab, rng.randint(1, 3))
 
-    return random.sample(candidates, random.randint(1, 3))
+def sample_ingredients_from_db():
+    return sample_ingredients(build_ingredient_vocab(), random)
 
 STYLES = ["상관없음", "초간단", "든든한 한 끼", "혼술 안주", "칼칼/매콤"]
 
@@ -50,30 +65,85 @@ def compute_metrics(menus, user_ings):
     return IPS, DPS, PPS
 
 # ------------------------------
-# 실험 루프
+# 1회 실행 (반복마다 seed 고정 → 병렬이어도 결과 재현)
 # ------------------------------
-ips, dps, pps = [], [], []
-
-for _ in range(N_TEST):
-    user_ings = sample_ingredients_from_db()
-    style = random.choice(STYLES)
+def run_one(i, vocab, seed=SEED, title_mode="none"):
+    rng = random.Random(seed + i)
+    user_ings = sample_ingredients(vocab, rng)
+    style = rng.choice(STYLES)
 
     menus = suggest_menus(
         user_story="오늘 집밥 먹고 싶다",
         ingredients=",".join(user_ings),
-        style_hint=style
+        style_hint=style,
+        title_mode=title_mode
     )
+    return compute_metrics(menus, user_ings)
 
-    I, D, P = compute_metrics(menus, user_ings)
+def _init_worker():
+    # spawn 된 워커마다 모델 / 벡터 스토어를 새로 만듦 (부모의 torch 스레드풀, SQLite 연결을 물려받지 않음)
+    import resources
+    resources.get_retriever(30)
 
-    ips.append(I)
-    dps.append(D)
-    pps.append(P)
+def _run_shard(args):
+    # 프로세스 워커용: 한 샤드(반복 번호 묶음)를 순서대로 실행
+    indices, vocab, seed, title_mode = args
+    return [(i, run_one(i, vocab, seed, title_mode)) for i in indices]
 
 # ------------------------------
-# 결과 출력
+# 실험 루프
 # ------------------------------
-print("\n===== AUTO PRIORITY EVALUATION =====")
-print(f"Ingredient Priority Score: {np.mean(ips):.3f} ± {np.std(ips):.3f}")
-print(f"Difficulty Priority Score: {np.mean(dps):.3f} ± {np.std(dps):.3f}")
-print(f"Popularity Priority Score: {np.mean(pps):.1f} ± {np.std(pps):.1f}")
+def run_experiment(n_test=N_TEST, workers=8, backend="thread", seed=SEED, title_mode="none"):
+    vocab = build_ingredient_vocab()
+    shards = [list(range(w, n_test, workers)) for w in range(workers)]
+    jobs = [(idx, vocab, seed, title_mode) for idx in shards if idx]
+
+    if workers <= 1:
+        results = _run_shard((list(range(n_test)), vocab, seed, title_mode))
+    else:
+        if backend == "process":
+            # fork 는 부모가 이미 연 torch 모델 / Chroma·SQLite 핸들을 공유하게 되므로 spawn 사용
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                       initializer=_init_worker)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+        with pool:
+            results = [r for shard in pool.map(_run_shard, jobs) for r in shard]
+
+    results.sort(key=lambda x: x[0])
+    ips = [r[1][0] for r in results]
+    dps = [r[1][1] for r in results]
+    pps = [r[1][2] for r in results]
+    return ips, dps, pps
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--n-test", type=int, default=N_TEST)
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("--backend", choices=["thread", "process"], default="thread")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--with-titles", action="store_true",
+                        help="제목 LLM 호출 포함 (지표에는 영향 거의 없음, 느림)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    ips, dps, pps = run_experiment(
+        n_test=args.n_test,
+        workers=args.workers,
+        backend=args.backend,
+        seed=args.seed,
+        title_mode="concurrent" if args.with_titles else "none"
+    )
+    elapsed = time.perf_counter() - t0
+
+    # ------------------------------
+    # 결과 출력
+    # ------------------------------
+    print("\n===== AUTO PRIORITY EVALUATION =====")
+    print(f"Ingredient Priority Score: {np.mean(ips):.3f} ± {np.std(ips):.3f}")
+    print(f"Difficulty Priority Score: {np.mean(dps):.3f} ± {np.std(dps):.3f}")
+    print(f"Popularity Priority Score: {np.mean(pps):.1f} ± {np.std(pps):.1f}")
+    print(f"({len(ips)} runs in {elapsed:.1f}s, workers={args.workers}, backend={args.backend})")
+
+if __name__ == "__main__":
+    main()
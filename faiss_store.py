@@ -0,0 +1,390 @@
+# faiss_store.py
+# Chroma 대신 쓸 수 있는 FAISS 벡터 스토어 (VECTOR_BACKEND=faiss)
+#   faiss_db/index.faiss   : flat / ivf / hnsw 인덱스 (mmap 으로 열어서 여러 프로세스가 페이지 공유)
+#   faiss_db/vectors.npy   : 원본 벡터 (필터 검색은 여기서 정확 계산, 증분 빌드 때 재임베딩 없이 재사용)
+#   faiss_db/meta.sqlite   : row → (id, page_content, metadata) 사이드 저장소
+#   faiss_db/config.json   : 인덱스 종류 / 차원 / 임베딩 모델 / 인코더
+#   faiss_db.pending.sqlite: 증분 빌드 중 persist() 전까지의 upsert / delete 체크포인트
+# 검색 쪽 인터페이스는 retriever.py 가 쓰는 Chroma 메서드와 같음
+# (similarity_search / similarity_search_by_vector / get / as_retriever)
+import json
+import math
+import os
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+FAISS_DIR = "./faiss_db"
+INDEX_TYPES = ["flat", "ivf", "hnsw"]
+DEFAULT_INDEX_TYPE = "hnsw"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 8
+
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.sqlite"
+CONFIG_FILE = "config.json"
+PENDING_SUFFIX = ".pending.sqlite"
+SUBSET_CHUNK = 4096     # 정확 계산 fallback 에서 한 번에 memmap 에서 읽는 row 수
+
+# ---------------------------
+# Index construction
+# ---------------------------
+def ivf_nlist(n: int) -> int:
+    # faiss 권장: 리스트당 학습 벡터 39개 이상
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+def build_index(vectors: np.ndarray, index_type: str = DEFAULT_INDEX_TYPE):
+    import faiss
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unknown index_type {index_type!r} (choose from {INDEX_TYPES})")
+    dim = vectors.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, ivf_nlist(len(vectors)))
+        index.train(vectors)
+    else:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.add(vectors)
+    return index
+
+def read_index_mmap(path: str):
+    import faiss
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # 오래된 faiss 는 일부 인덱스 종류만 mmap 지원
+        return faiss.read_index(path)
+
+def _model_name(embedding_function) -> Optional[str]:
+    return getattr(embedding_function, "model_name", None)
+
+def _encoder_name(embedding_function) -> str:
+    # OnnxEmbeddings.variant ("onnx" / "onnx-int8"), 없으면 sentence-transformers(torch)
+    return getattr(embedding_function, "variant", None) or "torch"
+
+# ---------------------------
+# where_document → SQL (Chroma 의 $contains / $or / $and 만 지원)
+# ---------------------------
+def where_document_sql(where: Dict) -> Tuple[str, List]:
+    if "$contains" in where:
+        return "instr(page_content, ?) > 0", [where["$contains"]]
+    for op, joiner in (("$or", " OR "), ("$and", " AND ")):
+        if op in where:
+            parts = [where_document_sql(w) for w in where[op]]
+            if not parts:
+                return "1", []
+            sql = joiner.join(f"({p})" for p, _ in parts)
+            return sql, [v for _, vals in parts for v in vals]
+    return "1", []
+
+# ---------------------------
+# Read side
+# ---------------------------
+class FaissRetriever:
+    """vectorstore.as_retriever(search_kwargs={"k": k}) 와 같은 역할"""
+
+    def __init__(self, store: "FaissStore", k: int = 4):
+        self.vectorstore = store
+        self.k = k
+
+    def invoke(self, query: str) -> List:
+        return self.vectorstore.similarity_search(query, k=self.k)
+
+class FaissStore:
+    def __init__(self, path: str = FAISS_DIR, embedding_function=None, mmap: bool = True,
+                 nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH):
+        self.path = path
+        self.embedding_function = embedding_function
+        with open(os.path.join(path, CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        model = _model_name(embedding_function)
+        if model and self.config.get("model") and model != self.config["model"]:
+            raise ValueError(f"FAISS index at {path} was built with {self.config['model']}, not {model}")
+        if embedding_function is not None and self.config.get("encoder"):
+            encoder = _encoder_name(embedding_function)
+            if encoder != self.config["encoder"]:
+                raise ValueError(f"FAISS index at {path} was built with encoder {self.config['encoder']}, "
+                                 f"not {encoder} (rebuild with --encoder {encoder} or set EMBED_ENCODER)")
+
+        index_path = os.path.join(path, INDEX_FILE)
+        if mmap:
+            self.index = read_index_mmap(index_path)
+        else:
+            import faiss
+            self.index = faiss.read_index(index_path)
+        if self.config["index_type"] == "ivf":
+            self.index.nprobe = nprobe
+        self.ef_search = ef_search
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r" if mmap else None)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{os.path.join(path, META_FILE)}?mode=ro",
+                                     uri=True, check_same_thread=False)
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal)
+
+    # ----- rows -----
+    def _rows(self, sql: str, params=()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _docs(self, rows: List[int]) -> List:
+        from langchain.docstore.document import Document
+        if not rows:
+            return []
+        marks = ",".join("?" * len(rows))
+        found = {
+            row: Document(page_content=text, metadata=json.loads(md))
+            for row, text, md in self._rows(
+                f"SELECT row, page_content, metadata FROM doc WHERE row IN ({marks})", rows
+            )
+        }
+        return [found[r] for r in rows if r in found]
+
+    # ----- search -----
+    def _search(self, vec: np.ndarray, k: int) -> List[int]:
+        if self.config["index_type"] == "hnsw":
+            self.index.hnsw.efSearch = max(self.ef_search, k)
+        _, idx = self.index.search(vec, min(k, len(self)))
+        return [int(i) for i in idx[0] if i >= 0]
+
+    def _search_params(self, rows: List[int], k: int):
+        import faiss
+        if not hasattr(faiss, "IDSelectorBatch") or not hasattr(faiss, "SearchParameters"):
+            return None
+        sel = faiss.IDSelectorBatch(np.asarray(rows, dtype=np.int64))
+        index_type = self.config["index_type"]
+        if index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(sel=sel, efSearch=max(self.ef_search, k))
+        elif index_type == "ivf":
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=self.index.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=sel)
+        # selector 는 params 가 참조만 하므로 같이 들고 있어야 함
+        return params, sel
+
+    def _search_subset(self, vec: np.ndarray, rows: List[int], k: int) -> List[int]:
+        # 필터에 맞는 row 만 인덱스 안에서 검색 (벡터 복사 없음)
+        k = min(k, len(rows))
+        found = self._search_params(rows, k)
+        if found is not None:
+            params, _sel = found
+            _, idx = self.index.search(vec, k, params=params)
+            hits = [int(i) for i in idx[0] if i >= 0]
+            # hnsw / ivf 는 조건이 좁으면 k 개를 못 채울 수 있음 → 그때만 정확 계산
+            if len(hits) >= k:
+                return hits
+        return self._exact_subset(vec, rows, k)
+
+    def _exact_subset(self, vec: np.ndarray, rows: List[int], k: int) -> List[int]:
+        # 정확한 L2, memmap 에서 SUBSET_CHUNK 개씩 읽어서 top-k 만 유지
+        best_rows = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float32)
+        for start in range(0, len(rows), SUBSET_CHUNK):
+            chunk = np.asarray(rows[start:start + SUBSET_CHUNK], dtype=np.int64)
+            sub = np.asarray(self.vectors[chunk], dtype=np.float32)
+            dist = ((sub - vec) ** 2).sum(axis=1)
+            best_rows = np.concatenate([best_rows, chunk])
+            best_dist = np.concatenate([best_dist, dist])
+            if len(best_rows) > k:
+                top = np.argpartition(best_dist, k - 1)[:k]
+                best_rows, best_dist = best_rows[top], best_dist[top]
+        order = np.lexsort((best_rows, best_dist))
+        return [int(r) for r in best_rows[order]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4,
+                                    where_document: Optional[Dict] = None, **kwargs) -> List:
+        vec = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        if not where_document:
+            return self._docs(self._search(vec, k))
+        sql, params = where_document_sql(where_document)
+        rows = [r for (r,) in self._rows(f"SELECT row FROM doc WHERE {sql} ORDER BY row", params)]
+        if not rows:
+            return []
+        return self._docs(self._search_subset(vec, rows, k))
+
+    def similarity_search(self, query: str, k: int = 4,
+                          where_document: Optional[Dict] = None, **kwargs) -> List:
+        vec = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector(vec, k=k, where_document=where_document)
+
+    # ----- Chroma 호환 조회 -----
+    def get(self, ids: Optional[List] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None, **kwargs) -> Dict:
+        """ids 또는 where={"id": {"$in": [...]}} (또는 {"id": x}) 만 지원"""
+        sql, params = "SELECT id, page_content, metadata FROM doc", []
+        if ids is not None:
+            keys = [str(i) for i in ids]
+            sql += f" WHERE id IN ({','.join('?' * len(keys))})"
+            params = keys
+        elif where:
+            cond = where.get("id")
+            values = cond.get("$in", []) if isinstance(cond, dict) else [cond]
+            keys = [str(v) for v in values]
+            sql += f" WHERE id IN ({','.join('?' * len(keys))})"
+            params = keys
+        rows = self._rows(sql + " ORDER BY row", params)
+        include = include or ["documents", "metadatas"]
+        out = {"ids": [r[0] for r in rows]}
+        if "documents" in include:
+            out["documents"] = [r[1] for r in rows]
+        if "metadatas" in include:
+            out["metadatas"] = [json.loads(r[2]) for r in rows]
+        return out
+
+    def as_retriever(self, search_kwargs: Optional[Dict] = None) -> FaissRetriever:
+        return FaissRetriever(self, k=(search_kwargs or {}).get("k", 4))
+
+# ---------------------------
+# Write side (build_vector_df.py 에서 Chroma 대신 사용)
+# ---------------------------
+class FaissWriter:
+    """
+    Chroma 의 add_documents / upsert / delete / get / persist 와 같은 모양의 빌더.
+    메모리에서 모아서 persist() 때 인덱스를 새로 만들고 디렉터리를 한 번에 교체.
+    기존 디렉터리가 있으면 벡터를 불러와서 바뀐 것만 임베딩 (증분 빌드).
+    upsert / delete 는 호출마다 pending 체크포인트에 기록되므로, persist() 전에 끊겨도
+    다시 열면 이어서 진행 (fresh=True 면 체크포인트도 버림).
+    """
+
+    def __init__(self, path: str = FAISS_DIR, embedding_function=None,
+                 index_type: str = DEFAULT_INDEX_TYPE, fresh: bool = False):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"unknown index_type {index_type!r} (choose from {INDEX_TYPES})")
+        self.path = path
+        self.embedding_function = embedding_function
+        self.index_type = index_type
+        self._rows: "OrderedDict[str, Tuple[np.ndarray, str, Dict]]" = OrderedDict()
+        self.pending_path = path.rstrip("/") + PENDING_SUFFIX
+        if fresh and os.path.exists(self.pending_path):
+            os.remove(self.pending_path)
+        if not fresh and os.path.exists(os.path.join(path, CONFIG_FILE)):
+            self._load()
+        self._pending = sqlite3.connect(self.pending_path)
+        self._pending.execute(
+            "CREATE TABLE IF NOT EXISTS pending (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT NOT NULL UNIQUE, vector BLOB, page_content TEXT, metadata TEXT)"
+        )
+        self._pending.commit()
+        if not fresh:
+            self._replay()
+
+    def _load(self):
+        vectors = np.load(os.path.join(self.path, VECTORS_FILE))
+        conn = sqlite3.connect(f"file:{os.path.join(self.path, META_FILE)}?mode=ro", uri=True)
+        for row, i, text, md in conn.execute("SELECT row, id, page_content, metadata FROM doc ORDER BY row"):
+            self._rows[i] = (vectors[row], text, json.loads(md))
+        conn.close()
+
+    def _replay(self):
+        n = 0
+        for i, vec, text, md in self._pending.execute(
+            "SELECT id, vector, page_content, metadata FROM pending ORDER BY seq"
+        ):
+            if vec is None:
+                self._rows.pop(i, None)
+            else:
+                self._rows[i] = (np.frombuffer(vec, dtype=np.float32).copy(), text, json.loads(md))
+            n += 1
+        if n:
+            print(f"FAISS writer: resumed {n} pending changes from {self.pending_path}")
+
+    def _checkpoint(self, records: List[Tuple]):
+        # 같은 id 는 마지막 기록만 남기고 순서는 뒤로
+        self._pending.executemany("DELETE FROM pending WHERE id = ?", [(r[0],) for r in records])
+        self._pending.executemany(
+            "INSERT INTO pending (id, vector, page_content, metadata) VALUES (?, ?, ?, ?)", records
+        )
+        self._pending.commit()
+
+    def get(self, include: Optional[List[str]] = None, **kwargs) -> Dict:
+        include = include or ["documents", "metadatas"]
+        out = {"ids": list(self._rows)}
+        if "documents" in include:
+            out["documents"] = [text for _, text, _ in self._rows.values()]
+        if "metadatas" in include:
+            out["metadatas"] = [md for _, _, md in self._rows.values()]
+        if "embeddings" in include:
+            out["embeddings"] = [v for v, _, _ in self._rows.values()]
+        return out
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict]):
+        records = []
+        for i, vec, text, md in zip(ids, embeddings, documents, metadatas):
+            vec = np.asarray(vec, dtype=np.float32)
+            self._rows[str(i)] = (vec, text, md)
+            records.append((str(i), vec.tobytes(), text,
+                            json.dumps(md, ensure_ascii=False, separators=(",", ":"))))
+        self._checkpoint(records)
+
+    def add_documents(self, documents: List, ids: List[str]):
+        vectors = self.embedding_function.embed_documents([d.page_content for d in documents])
+        self.upsert(ids, vectors, [d.page_content for d in documents],
+                    [d.metadata for d in documents])
+
+    def delete(self, ids: List[str]):
+        for i in ids:
+            self._rows.pop(str(i), None)
+        self._checkpoint([(str(i), None, None, None) for i in ids])
+
+    def persist(self):
+        import faiss
+        if not self._rows:
+            raise ValueError("no documents to write")
+        tmp = self.path.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        vectors = np.ascontiguousarray(np.stack([v for v, _, _ in self._rows.values()]), dtype=np.float32)
+        faiss.write_index(build_index(vectors, self.index_type), os.path.join(tmp, INDEX_FILE))
+        np.save(os.path.join(tmp, VECTORS_FILE), vectors)
+
+        conn = sqlite3.connect(os.path.join(tmp, META_FILE))
+        conn.execute(
+            "CREATE TABLE doc (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO doc (row, id, page_content, metadata) VALUES (?, ?, ?, ?)",
+            (
+                (row, i, text, json.dumps(md, ensure_ascii=False, separators=(",", ":")))
+                for row, (i, (_, text, md)) in enumerate(self._rows.items())
+            ),
+        )
+        conn.commit()
+        conn.close()
+
+        with open(os.path.join(tmp, CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "index_type": self.index_type,
+                "metric": "l2",
+                "dim": int(vectors.shape[1]),
+                "count": int(vectors.shape[0]),
+                "model": _model_name(self.embedding_function),
+                "encoder": _encoder_name(self.embedding_function),
+            }, f, ensure_ascii=False, indent=2)
+
+        # 이미 mmap 으로 열어둔 프로세스는 예전 파일을 계속 보고, 새로 여는 쪽만 새 인덱스를 봄
+        old = self.path.rstrip("/") + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+        # 새 디렉터리에 전부 들어갔으므로 체크포인트 비움
+        self._pending.execute("DELETE FROM pending")
+        self._pending.commit()
@@ -0,0 +1,71 @@
+# fake_llm.py
+# 네트워크 없이 도는 가짜 chat 모델 (테스트/벤치마크용). rag_llm.set_llm(FakeChatModel()) 로 교체.
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class FakeMessage:
+    content: str
+
+class FakeChatModel:
+    """
+    langchain chat 모델처럼 invoke / stream / ainvoke / astream 지원.
+    latency       : 첫 응답(첫 토큰)까지 지연 (초)
+    token_latency : 스트리밍 토큰 사이 지연 (초)
+    """
+
+    model_name = "fake-chat"
+    temperature = 0.0
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0,
+                 response: Optional[str] = None, tokens: int = 40):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.response = response
+        self.tokens = tokens
+        self.calls = 0
+
+    def _text(self, prompt: str) -> str:
+        if self.response is not None:
+            return self.response
+        if "JSON array" in prompt:
+            # 제목 일괄 생성 프롬프트
+            n = prompt.count("\n", prompt.find("Original dishes:"), prompt.find("User mood:")) - 1
+            return "[" + ", ".join(f'"fake title {i + 1}"' for i in range(max(n, 0))) + "]"
+        if "Output ONLY the title" in prompt:
+            m = re.search(r"Original dish: (.*)", prompt)
+            return f"fake {m.group(1).strip()}" if m else "fake title"
+        return " ".join(f"tok{i}" for i in range(self.tokens))
+
+    def _chunks(self, prompt: str):
+        words = self._text(prompt).split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def invoke(self, prompt: str) -> FakeMessage:
+        self.calls += 1
+        time.sleep(self.latency)
+        return FakeMessage(self._text(prompt))
+
+    def stream(self, prompt: str):
+        self.calls += 1
+        time.sleep(self.latency)
+        for i, c in enumerate(self._chunks(prompt)):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield FakeMessage(c)
+
+    async def ainvoke(self, prompt: str) -> FakeMessage:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return FakeMessage(self._text(prompt))
+
+    async def astream(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for i, c in enumerate(self._chunks(prompt)):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield FakeMessage(c)
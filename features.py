@@ -0,0 +1,87 @@
+# features.py
+# 랭킹 피처 파싱: 인덱스 빌드 시 metadata 에 미리 저장, 예전 인덱스는 쿼리 시 파싱 (fallback)
+import re
+from typing import Dict, List, Optional, Set
+
+from ingredient_index import expand_query_ingredient, parse_ingredient_text
+
+EASY_LEVELS = ["초급", "아무나", "쉬움", "Easy"]
+POP_VIEWS = 5000.0
+POP_MAX = 5.0
+
+def normalize_level(level: str) -> str:
+    return (level or "").strip()
+
+def time_to_minutes(time_str: str) -> int:
+    if not time_str:
+        return 9999
+    t = time_str.strip()
+    if "정보" in t:
+        return 9999
+    m = re.search(r"(\d+)\s*분", t)
+    if m:
+        return int(m.group(1))
+    return 9999
+
+def level_to_score(level: str) -> int:
+    if level in EASY_LEVELS:
+        return 5
+    if level == "중급":
+        return 2
+    return 0
+
+def popularity_score(views: int) -> float:
+    return min(POP_MAX, views / POP_VIEWS)
+
+# ---------------------------
+# Build time: metadata 에 들어갈 값
+# ---------------------------
+def precompute_features(level: str, views: int, time_str: str, ingredient_text: str) -> Dict:
+    lv = normalize_level(level)
+    return {
+        "cook_minutes": time_to_minutes(time_str),
+        "level_score": level_to_score(lv),
+        "pop_score": popularity_score(views),
+        # Chroma metadata 는 list 를 못 담아서 콤마 문자열로 저장
+        "ingredients": ",".join(parse_ingredient_text(ingredient_text)),
+    }
+
+# ---------------------------
+# Query time: 미리 계산된 값 우선, 없으면 파싱
+# ---------------------------
+def doc_features(md: Dict) -> Dict:
+    level = normalize_level(md.get("level", ""))
+    views = int(md.get("views", 0) or 0)
+
+    cook_time = md.get("cook_minutes")
+    cook_time = time_to_minutes(md.get("time", "")) if cook_time is None else int(cook_time)
+
+    level_score = md.get("level_score")
+    level_score = level_to_score(level) if level_score is None else int(level_score)
+
+    pop_score = md.get("pop_score")
+    pop_score = popularity_score(views) if pop_score is None else float(pop_score)
+
+    ings = md.get("ingredients")
+    ing_set: Optional[Set[str]] = None if ings is None else set(filter(None, str(ings).split(",")))
+
+    return {
+        "level": level,
+        "views": views,
+        "cook_time": cook_time,
+        "level_score": level_score,
+        "pop_score": pop_score,
+        "ingredients": ing_set,
+    }
+
+def expand_user_ingredients(user_ings: List[str]) -> List[Set[str]]:
+    return [set(expand_query_ingredient(ing)) for ing in user_ings]
+
+def ingredient_hits(ing_set: Optional[Set[str]], text: str, user_ings: List[str],
+                    expanded: Optional[List[Set[str]]] = None) -> int:
+    # 본문 부분 문자열과 같은 기준 ('고기' 는 '돼지고기' 에 걸림, $contains 필터 / 학습된 W_ING 와 일치)
+    # 정규화된 재료 목록이 있으면 그 안에서 찾으므로 동의어('계란' → '달걀')도 잡힘
+    if ing_set is None:
+        return sum(1 for ing in user_ings if ing in text)
+    expanded = expanded if expanded is not None else expand_user_ingredients(user_ings)
+    return sum(1 for toks in expanded if any(tok in ing for tok in toks for ing in ing_set))
@@ -0,0 +1,152 @@
+# hybrid_retriever.py
+# BM25(어휘) + Chroma(벡터) 결과를 RRF(Reciprocal Rank Fusion)로 합치는 리트리버
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+BM25_PATH = "./bm25_index.pkl"
+RRF_K = 60
+HYBRID_K = 10
+
+# ---------------------------
+# Tokenizer (한국어 은어 대응: 어절 + 글자 bigram)
+# ---------------------------
+_WORD = re.compile(r"[가-힣]+|[A-Za-z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for w in _WORD.findall((text or "").lower()):
+        tokens.append(w)
+        if len(w) > 2 and re.match(r"[가-힣]", w):
+            tokens.extend(w[i:i + 2] for i in range(len(w) - 1))
+    return tokens
+
+# ---------------------------
+# BM25 index
+# ---------------------------
+class BM25Index:
+    def __init__(self, docs: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = [(d.page_content or "", dict(d.metadata or {})) for d in docs]
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_len = []
+        for i, (text, _) in enumerate(self.docs):
+            tf = Counter(tokenize(text))
+            self.doc_len.append(sum(tf.values()))
+            for tok, c in tf.items():
+                self.postings.setdefault(tok, {})[i] = c
+        n = len(self.docs)
+        self.avg_len = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            tok: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for tok, p in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = HYBRID_K, where_document: Optional[Dict] = None) -> List[Document]:
+        scores: Dict[int, float] = {}
+        for tok in set(tokenize(query)):
+            idf = self.idf.get(tok)
+            if idf is None:
+                continue
+            for i, tf in self.postings[tok].items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[i] / (self.avg_len or 1.0))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        out = []
+        for i in ranked:
+            text, md = self.docs[i]
+            if where_document and not match_where_document(text, where_document):
+                continue
+            out.append(Document(page_content=text, metadata=dict(md)))
+            if len(out) >= k:
+                break
+        return out
+
+    def save(self, path: str = BM25_PATH):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str = BM25_PATH) -> "BM25Index":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+def match_where_document(text: str, where: Dict) -> bool:
+    # Chroma where_document 중 $contains / $or / $and 만 지원
+    if "$contains" in where:
+        return where["$contains"] in text
+    if "$or" in where:
+        return any(match_where_document(text, w) for w in where["$or"])
+    if "$and" in where:
+        return all(match_where_document(text, w) for w in where["$and"])
+    return True
+
+def load_or_build_bm25(store, path: str = BM25_PATH) -> BM25Index:
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    res = store.get(include=["documents", "metadatas"])
+    docs = [
+        Document(page_content=text or "", metadata=md or {})
+        for text, md in zip(res.get("documents") or [], res.get("metadatas") or [])
+    ]
+    index = BM25Index(docs)
+    index.save(path)
+    return index
+
+# ---------------------------
+# Reciprocal Rank Fusion
+# ---------------------------
+def doc_key(doc: Document):
+    md = doc.metadata or {}
+    return md.get("id") if md.get("id") is not None else doc.page_content
+
+def rrf_fuse(result_lists: List[List[Document]], k: int = HYBRID_K, rrf_k: int = RRF_K) -> List[Document]:
+    scores = {}
+    first = {}
+    for docs in result_lists:
+        for rank, d in enumerate(docs):
+            key = doc_key(d)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            first.setdefault(key, d)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [first[key] for key in ranked[:k]]
+
+class HybridRetriever:
+    """
+    retriever.invoke(query) 와 같은 인터페이스.
+    similarity_search(query, k, where_document) 도 지원해서
+    filtered_search(store=...) 에 그대로 넣을 수 있음.
+    """
+
+    def __init__(self, vectorstore, bm25: BM25Index, k: int = HYBRID_K,
+                 fetch_k: Optional[int] = None, rrf_k: int = RRF_K):
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.k = k
+        self.fetch_k = fetch_k or k * 2
+        self.rrf_k = rrf_k
+
+    def similarity_search(self, query: str, k: Optional[int] = None,
+                          where_document: Optional[Dict] = None) -> List[Document]:
+        k = k or self.k
+        fetch_k = max(self.fetch_k, k)
+        kwargs = {"where_document": where_document} if where_document else {}
+        vec_docs = self.vectorstore.similarity_search(query, k=fetch_k, **kwargs)
+        lex_docs = self.bm25.search(query, k=fetch_k, where_document=where_document)
+        return rrf_fuse([vec_docs, lex_docs], k=k, rrf_k=self.rrf_k)
+
+    def get(self, **kwargs):
+        return self.vectorstore.get(**kwargs)
+
+    def invoke(self, query: str) -> List[Document]:
+        return self.similarity_search(query, k=self.k)
+
+def build_hybrid_retriever(vectorstore, k: int = HYBRID_K, path: str = BM25_PATH) -> HybridRetriever:
+    return HybridRetriever(vectorstore, load_or_build_bm25(vectorstore, path), k=k)
@@ -0,0 +1,159 @@
+# ingredient_index.py
+# 재료 → 레시피ID 역색인 (동의어 정규화 포함)
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+INDEX_PATH = "./ingredient_index.json"
+
+# ---------------------------
+# Synonym table (표기 → 대표 재료명)
+# ---------------------------
+SYNONYMS = {
+    "돈육": "돼지고기", "돼지": "돼지고기", "삼겹살": "돼지고기", "목살": "돼지고기",
+    "앞다리살": "돼지고기", "뒷다리살": "돼지고기", "다짐육": "다진고기",
+    "우육": "소고기", "쇠고기": "소고기", "한우": "소고기", "차돌박이": "소고기",
+    "닭": "닭고기", "계육": "닭고기", "닭다리": "닭고기", "치킨": "닭고기",
+    "계란": "달걀", "에그": "달걀", "egg": "달걀",
+    "파": "대파", "실파": "쪽파",
+    "다진마늘": "마늘", "통마늘": "마늘", "깐마늘": "마늘",
+    "청양고추": "고추", "풋고추": "고추", "홍고추": "고추",
+    "고추가루": "고춧가루",
+    "진간장": "간장", "양조간장": "간장", "국간장": "간장", "조선간장": "간장",
+    "흰설탕": "설탕", "황설탕": "설탕",
+    "배추김치": "김치", "묵은지": "김치", "신김치": "김치",
+    "쌀밥": "밥", "공기밥": "밥", "햇반": "밥",
+    "야채": "채소",
+}
+
+# 어패류 같은 상위 분류는 하위 재료 전체로 확장
+CATEGORIES = {
+    "어패류": ["조개", "바지락", "홍합", "굴", "오징어", "새우", "전복", "꼬막", "낙지", "주꾸미", "생선", "고등어", "연어"],
+    "해산물": ["조개", "바지락", "홍합", "굴", "오징어", "새우", "전복", "꼬막", "낙지", "주꾸미"],
+    "채소": ["양파", "당근", "애호박", "호박", "양배추", "브로콜리", "버섯", "시금치", "파프리카", "오이", "감자"],
+}
+
+_SECTION = re.compile(r"\[[^\]]*\]")
+_ITEM_SPLIT = re.compile(r"[|,\n]+")
+_QUANTITY = re.compile(r"[\d½¼¾⅓⅔(（].*$")
+# 재료 이름이 아닌 단어: 손질 상태 수식어 / 숫자 없는 양 표기 ('소금약간' 처럼 붙어 있어도 떼어냄)
+MODIFIERS = {"다진", "깐", "썬", "채썬", "삶은", "데친", "볶은", "구운", "불린", "말린",
+             "냉동", "손질한", "손질된", "으깬", "생"}
+_AMOUNT_WORDS = re.compile(r"(약간|적당량|적당히|조금|넉넉히|한줌|한꼬집|톡톡)$")
+
+def normalize_ingredient(name: str) -> str:
+    t = re.sub(r"\s+", "", (name or "").strip().lower())
+    return SYNONYMS.get(t, t)
+
+def split_ingredient_items(text: str) -> List[str]:
+    """'[재료] 김치 1/4포기| 두부 반모 [양념] 간장 2T' → ['김치 1/4포기', '두부 반모', '간장 2T'] (양 표기는 그대로)"""
+    items = (raw.strip() for raw in _ITEM_SPLIT.split(_SECTION.sub("|", str(text or ""))))
+    return [raw for raw in items if raw]
+
+def ingredient_words(item: str) -> List[str]:
+    """'다진 마늘 약간' → ['마늘'] (양 / 수식어 제거, 단어 단위)"""
+    words = []
+    for w in _QUANTITY.sub("", item).split():
+        w = _AMOUNT_WORDS.sub("", w)
+        if w and w not in MODIFIERS:
+            words.append(w)
+    return words
+
+def parse_ingredient_text(text: str) -> List[str]:
+    """
+    '[재료] 돼지고기 300g| 양파 1개 [양념] 간장 2T, 소금 약간' → ['돼지고기', '양파', '간장', '소금']
+    """
+    if not text:
+        return []
+    tokens = []
+    seen = set()
+    # '간장/굴소스' 같은 대체 재료는 따로 색인 ('1/4포기' 의 뒷부분은 양이라 ingredient_words 에서 빠짐)
+    for item in (part for raw in split_ingredient_items(text) for part in raw.split("/")):
+        words = ingredient_words(item)
+        if not words:
+            continue
+        # '돼지고기 앞다리살' 은 단어마다 색인 (붙인 '돼지고기앞다리살' 은 동의어 표에 있을 때만)
+        cands = list(words)
+        joined = "".join(words).lower()
+        if len(words) > 1 and joined in SYNONYMS:
+            cands.append(joined)
+        for cand in cands:
+            tok = normalize_ingredient(cand)
+            if tok and tok not in seen:
+                seen.add(tok)
+                tokens.append(tok)
+    return tokens
+
+def expand_query_ingredient(ing: str) -> List[str]:
+    tok = normalize_ingredient(ing)
+    return [tok] + [normalize_ingredient(x) for x in CATEGORIES.get(tok, [])]
+
+# ---------------------------
+# Inverted index
+# ---------------------------
+def build_inverted_index(rows: Iterable) -> Dict[str, List[int]]:
+    """rows: (recipe_id, 재료내용) 쌍"""
+    postings: Dict[str, Set[int]] = {}
+    for recipe_id, ing_text in rows:
+        if recipe_id is None:
+            continue
+        for tok in parse_ingredient_text(ing_text):
+            postings.setdefault(tok, set()).add(int(recipe_id))
+    return {tok: sorted(ids) for tok, ids in postings.items()}
+
+def save_index(index: Dict[str, List[int]], path: str = INDEX_PATH,
+               views: Optional[Dict[int, int]] = None):
+    """views: 레시피ID → 조회수 (후보를 인기 순으로 고를 때 사용)"""
+    payload = {
+        "postings": index,
+        "views": {str(k): int(v or 0) for k, v in (views or {}).items()},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+
+class IngredientIndex:
+    def __init__(self, postings: Dict[str, List[int]], views: Optional[Dict] = None):
+        self.postings = {tok: frozenset(ids) for tok, ids in postings.items()}
+        self.views = {int(k): int(v) for k, v in (views or {}).items()}
+
+    def rank(self, ids: Iterable[int]) -> List[int]:
+        """조회수 높은 순 (조회수 없는 예전 색인은 ID 순)"""
+        return sorted(ids, key=lambda i: (-self.views.get(i, 0), i))
+
+    def lookup(self, ing: str) -> Set[int]:
+        # 본문 $contains 필터와 같이 부분 문자열 기준 ('고기' → '돼지고기', '소고기' ...)
+        toks = expand_query_ingredient(ing)
+        ids = set()
+        for key, posting in self.postings.items():
+            if any(tok in key for tok in toks):
+                ids |= posting
+        return ids
+
+    def candidates(self, ingredients: List[str], mode: str = "and") -> Set[int]:
+        sets = [self.lookup(ing) for ing in ingredients if ing]
+        if not sets:
+            return set()
+        if mode == "or":
+            return set().union(*sets)
+        sets.sort(key=len)
+        out = set(sets[0])
+        for s in sets[1:]:
+            out &= s
+            if not out:
+                break
+        return out
+
+_index = None
+
+def load_index(path: str = INDEX_PATH) -> Optional[IngredientIndex]:
+    global _index
+    if _index is None and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if "postings" in data and isinstance(data["postings"], dict):
+            _index = IngredientIndex(data["postings"], data.get("views"))
+        else:
+            # 조회수 없이 postings 만 저장하던 예전 형식
+            _index = IngredientIndex(data)
+    return _index
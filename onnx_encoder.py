@@ -0,0 +1,240 @@
+# onnx_encoder.py
+# 쿼리/문서 임베딩을 PyTorch 대신 onnxruntime 으로 (선택: dynamic int8 양자화)
+#   python onnx_encoder.py export            # 한 번만: ONNX 변환 + int8 양자화 (torch/transformers 필요)
+#   python onnx_encoder.py check -n 500      # 원래 모델과 cosine 일치도 / top-k 검색 겹침 / 지연 비교
+# 서빙 쪽은 onnxruntime + tokenizers 만 있으면 됨 (EMBED_ENCODER=onnx-int8)
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ONNX_DIR = "./onnx_encoder"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+CONFIG_FILE = "encoder.json"
+MAX_LENGTH = 128        # sentence-transformers 의 max_seq_length 와 같게
+ENCODE_BATCH = 32
+
+# ---------------------------
+# Export (torch 필요, 한 번만)
+# ---------------------------
+def export_onnx(model_name: str, out_dir: str = ONNX_DIR, quantize: bool = True) -> Dict:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tok.save_pretrained(out_dir)
+
+    sample = tok(["김치찌개 레시피", "quick dinner"], return_tensors="pt", padding=True)
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    kwargs = dict(
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "seq"},
+            "attention_mask": {0: "batch", 1: "seq"},
+            "last_hidden_state": {0: "batch", 1: "seq"},
+        },
+        opset_version=14,
+        do_constant_folding=True,
+    )
+    with torch.no_grad():
+        try:
+            torch.onnx.export(model, (sample["input_ids"], sample["attention_mask"]), fp32_path,
+                              dynamo=False, **kwargs)
+        except TypeError:
+            # dynamo 인자가 없는 예전 torch
+            torch.onnx.export(model, (sample["input_ids"], sample["attention_mask"]), fp32_path, **kwargs)
+
+    files = {"fp32": FP32_FILE}
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, INT8_FILE), weight_type=QuantType.QInt8)
+        files["int8"] = INT8_FILE
+
+    config = {
+        "model": model_name,
+        "max_length": MAX_LENGTH,
+        "pad_id": tok.pad_token_id,
+        "pad_token": tok.pad_token,
+        "files": files,
+    }
+    with open(os.path.join(out_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return config
+
+def load_exported(model_name: str, out_dir: str = ONNX_DIR, quantized: bool = True) -> Dict:
+    """
+    export 결과의 encoder.json. 서빙 쪽에서 torch 없이 쓰므로 여기서 export 하지 않고,
+    없거나 다른 모델 / 양자화 안 된 결과면 export 명령을 알려주는 에러.
+    """
+    path = os.path.join(out_dir, CONFIG_FILE)
+    hint = f"run `python onnx_encoder.py export --model {model_name} --dir {out_dir}` first " \
+           f"(needs torch + transformers), or use EMBED_ENCODER=torch"
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no exported ONNX encoder at {out_dir}: {hint}")
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("model") != model_name:
+        raise ValueError(f"ONNX encoder at {out_dir} was exported from {config.get('model')}, "
+                         f"not {model_name}: {hint}")
+    variant = "int8" if quantized else "fp32"
+    if variant not in config["files"]:
+        raise FileNotFoundError(f"ONNX encoder at {out_dir} has no {variant} model: {hint}")
+    return config
+
+# ---------------------------
+# Serving
+# ---------------------------
+class OnnxEmbeddings:
+    """
+    HuggingFaceEmbeddings 와 같은 embed_query / embed_documents.
+    mean pooling, 정규화 없음 (sentence-transformers 원래 모델 출력과 같은 공간).
+    """
+
+    def __init__(self, model_name: str, model_dir: str = ONNX_DIR, quantized: bool = True,
+                 threads: Optional[int] = None, batch_size: int = ENCODE_BATCH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        config = load_exported(model_name, model_dir, quantized)
+        self.model_name = model_name
+        self.variant = "onnx-int8" if quantized else "onnx"
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_id"], pad_token=config["pad_token"])
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        model_file = config["files"]["int8" if quantized else "fp32"]
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), opts,
+                                            providers=["CPUExecutionProvider"])
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encs = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in encs], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encs], dtype=np.int64)
+        hidden = self.session.run(["last_hidden_state"],
+                                  {"input_ids": ids, "attention_mask": mask})[0]
+        m = mask[..., None].astype(np.float32)
+        return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            out.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+# ---------------------------
+# Agreement check (원래 모델 대비)
+# ---------------------------
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    na = np.linalg.norm(a, axis=1)
+    nb = np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.clip(na * nb, 1e-12, None)
+
+def _top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # Chroma / FAISS 와 같은 L2 거리
+    d = (queries ** 2).sum(1)[:, None] - 2.0 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :]
+    return np.argsort(d, axis=1, kind="stable")[:, :k]
+
+def check_agreement(reference, candidate, corpus: List[str], queries: List[str], k: int = 10) -> Dict:
+    """
+    reference: 원래 모델 (HuggingFaceEmbeddings), candidate: OnnxEmbeddings.
+    코퍼스는 reference 로 임베딩 (기존 인덱스 그대로 두고 쿼리 인코더만 바꾸는 경우를 재현).
+    """
+    corpus_ref = np.asarray(reference.embed_documents(corpus), dtype=np.float32)
+    corpus_new = np.asarray(candidate.embed_documents(corpus), dtype=np.float32)
+
+    q_ref, q_new, t_ref, t_new = [], [], [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        q_ref.append(reference.embed_query(q))
+        t_ref.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        q_new.append(candidate.embed_query(q))
+        t_new.append(time.perf_counter() - t0)
+    q_ref = np.asarray(q_ref, dtype=np.float32)
+    q_new = np.asarray(q_new, dtype=np.float32)
+
+    doc_cos = _cosine_rows(corpus_ref, corpus_new)
+    query_cos = _cosine_rows(q_ref, q_new)
+    k = min(k, len(corpus))
+    top_ref = _top_k(corpus_ref, q_ref, k)
+    top_new = _top_k(corpus_ref, q_new, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(top_ref, top_new)]
+
+    return {
+        "docs": len(corpus),
+        "queries": len(queries),
+        "k": k,
+        "doc_cosine_mean": round(float(doc_cos.mean()), 5),
+        "doc_cosine_min": round(float(doc_cos.min()), 5),
+        "query_cosine_mean": round(float(query_cos.mean()), 5),
+        "query_cosine_min": round(float(query_cos.min()), 5),
+        "overlap_at_k_mean": round(float(np.mean(overlap)), 4),
+        "overlap_at_k_min": round(float(np.min(overlap)), 4),
+        "top1_agreement": round(float(np.mean(top_ref[:, 0] == top_new[:, 0])), 4),
+        "query_ms_reference_p50": round(float(np.percentile(t_ref, 50)) * 1000.0, 3),
+        "query_ms_candidate_p50": round(float(np.percentile(t_new, 50)) * 1000.0, 3),
+    }
+
+def _sample_corpus(n: int) -> List[str]:
+    import sqlite3
+    from recipe_store import RECIPE_STORE_PATH
+    conn = sqlite3.connect(f"file:{RECIPE_STORE_PATH}?mode=ro", uri=True)
+    rows = conn.execute("SELECT page_content FROM recipe ORDER BY id LIMIT ?", (n,)).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def _sample_queries(corpus: List[str]) -> List[str]:
+    from eval_scenarios import SCENARIOS
+    queries = [sc["query"] for sc in SCENARIOS]
+    # 요리명만으로 된 짧은 쿼리도 섞음
+    queries += [c.splitlines()[0].partition(":")[2].strip() for c in corpus[:50]]
+    return [q for q in queries if q]
+
+def main():
+    from resources import EMBED_MODEL
+
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_export = sub.add_parser("export", help="ONNX 변환 + int8 양자화")
+    p_export.add_argument("--no-quantize", action="store_true")
+    p_check = sub.add_parser("check", help="원래 모델과 일치도 비교")
+    p_check.add_argument("-n", type=int, default=500, help="코퍼스 문서 수 (recipe_docs.sqlite)")
+    p_check.add_argument("-k", type=int, default=10)
+    p_check.add_argument("--fp32", action="store_true", help="양자화 안 한 ONNX 로 비교")
+    for p in (p_export, p_check):
+        p.add_argument("--model", default=EMBED_MODEL)
+        p.add_argument("--dir", default=ONNX_DIR)
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        config = export_onnx(args.model, args.dir, quantize=not args.no_quantize)
+        for f in config["files"].values():
+            path = os.path.join(args.dir, f)
+            print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+        return
+
+    from langchain.embeddings import HuggingFaceEmbeddings
+    reference = HuggingFaceEmbeddings(model_name=args.model)
+    candidate = OnnxEmbeddings(args.model, args.dir, quantized=not args.fp32)
+    corpus = _sample_corpus(args.n)
+    result = check_agreement(reference, candidate, corpus, _sample_queries(corpus), k=args.k)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
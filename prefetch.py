@@ -0,0 +1,126 @@
+# prefetch.py
+# 메뉴 카드를 보는 동안 상위 카드의 레시피를 미리 생성해서 토큰을 버퍼링.
+# 사용자가 그 메뉴를 고르면 버퍼를 바로 내보내고 이어서 실시간 스트림을 붙임.
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+import tracing
+from rag_pipeline import recipe_stream
+
+PREFETCH_TOP_N = 1      # 미리 만들 카드 수
+PREFETCH_MAX_JOBS = 2   # 동시에 돌릴 최대 prefetch 수 (LLM 비용 예산)
+PREFETCH_TRACE = "prefetch"
+
+class _Job:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cancelled = threading.Event()
+        self.cond = threading.Condition()
+
+class RecipePrefetcher:
+    def __init__(self, stream_fn: Callable = recipe_stream, max_jobs: int = PREFETCH_MAX_JOBS):
+        self.stream_fn = stream_fn
+        self.max_jobs = max_jobs
+        self._jobs: Dict[Hashable, _Job] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0}
+
+    # ---------------------------
+    # 시작 / 취소
+    # ---------------------------
+    def prefetch(self, key: Hashable, *args, **kwargs) -> bool:
+        with self._lock:
+            if key in self._jobs:
+                return False
+            running = sum(1 for j in self._jobs.values() if not j.done)
+            if running >= self.max_jobs:
+                return False
+            job = _Job()
+            self._jobs[key] = job
+            self.stats["started"] += 1
+
+        t = threading.Thread(target=self._run, args=(job, args, kwargs),
+                             name="recipe-prefetch", daemon=True)
+        t.start()
+        return True
+
+    def _run(self, job: _Job, args, kwargs):
+        # recipe_stream 의 span 이 이 루트 아래로 들어가서 디버그 패널의 "마지막 요청" 을 덮지 않음
+        root = tracing.start_span(PREFETCH_TRACE, background=True)
+        gen = self.stream_fn(*args, **kwargs)
+        try:
+            with tracing.use_span(root):
+                for chunk in gen:
+                    if job.cancelled.is_set():
+                        root.set(cancelled=True)
+                        break
+                    with job.cond:
+                        job.chunks.append(chunk)
+                        job.cond.notify_all()
+        except BaseException as e:
+            job.error = e
+            root.record_error(e)
+        finally:
+            gen.close()
+            root.end(chunks=len(job.chunks))
+            with job.cond:
+                job.done = True
+                job.cond.notify_all()
+
+    def cancel(self, key: Hashable):
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancelled.set()
+            self.stats["cancelled"] += 1
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for job in jobs:
+            job.cancelled.set()
+        self.stats["cancelled"] += len(jobs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._jobs
+
+    # ---------------------------
+    # 소비
+    # ---------------------------
+    def take(self, key: Hashable) -> Optional[_Job]:
+        """key 의 job 을 꺼내고 나머지(안 쓰인 prefetch)는 취소. hit/miss 기록."""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        self.cancel_all()
+        self.stats["hits" if job is not None else "misses"] += 1
+        return job
+
+    def stream(self, key: Hashable, *args, **kwargs):
+        """prefetch 된 게 있으면 버퍼 + 이어지는 토큰, 없으면 그냥 실시간 생성."""
+        job = self.take(key)
+        if job is None or job.error is not None:
+            yield from self.stream_fn(*args, **kwargs)
+            return
+
+        i = 0
+        while True:
+            with job.cond:
+                while i >= len(job.chunks) and not job.done:
+                    job.cond.wait()
+                pending = job.chunks[i:]
+                finished = job.done
+            for chunk in pending:
+                yield chunk
+            i += len(pending)
+            if finished and i >= len(job.chunks):
+                break
+        if job.error is not None:
+            raise job.error
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
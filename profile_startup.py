@@ -0,0 +1,63 @@
+# profile_startup.py
+# 시작 시간 프로파일: 컴포넌트별 import / 초기화 시간 측정
+#   python profile_startup.py            # 표 출력
+#   python profile_startup.py --json     # JSON 출력 (커밋 간 비교용)
+import argparse
+import importlib
+import json
+import time
+
+def _timed(steps, name, fn):
+    t0 = time.perf_counter()
+    try:
+        fn()
+        err = ""
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"
+    steps.append({"step": name, "seconds": round(time.perf_counter() - t0, 4), "error": err})
+
+def profile() -> list:
+    steps = []
+
+    # ---- import (가벼워야 하는 것들) ----
+    for mod in ["rag_llm", "retriever", "rag_pipeline"]:
+        _timed(steps, f"import {mod}", lambda m=mod: importlib.import_module(m))
+
+    # ---- 무거운 의존성 ----
+    for mod in ["langchain_openai", "langchain.embeddings", "langchain.vectorstores", "sentence_transformers"]:
+        _timed(steps, f"import {mod}", lambda m=mod: importlib.import_module(m))
+
+    # ---- 초기화 ----
+    import resources
+    import rag_llm
+    _timed(steps, "init embedding model", resources.get_embedding)
+    _timed(steps, "init vector store", resources.get_vectorstore)
+    _timed(steps, "init llm client", rag_llm.get_llm)
+    _timed(steps, "first embed_query", lambda: resources.get_embedding().base.embed_query(resources.WARM_UP_QUERY))
+    _timed(steps, "second embed_query", lambda: resources.get_embedding().base.embed_query(resources.WARM_UP_QUERY))
+    _timed(steps, "first similarity_search", lambda: resources.get_vectorstore().similarity_search(resources.WARM_UP_QUERY, k=1))
+    return steps
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    steps = profile()
+    total = round(time.perf_counter() - t0, 4)
+
+    if args.json:
+        print(json.dumps({"total_seconds": total, "steps": steps}, ensure_ascii=False, indent=2))
+        return
+
+    print("\n===== STARTUP PROFILE =====")
+    for s in steps:
+        line = f"{s['step']:<36} {s['seconds']:>8.3f}s"
+        if s["error"]:
+            line += f"  ({s['error']})"
+        print(line)
+    print(f"{'total':<36} {total:>8.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,223 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+
+import tracing
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.6
-)
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0.6
+
+# ChatOpenAI(langchain_openai + openai) 는 import 가 무거워서 처음 쓸 때 생성
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from langchain_openai import ChatOpenAI
+            _llm = ChatOpenAI(
+                model=LLM_MODEL,
+                temperature=LLM_TEMPERATURE
+            )
+        return _llm
+
+def set_llm(model):
+    """LLM 교체 (테스트/벤치마크에서 fake_llm.FakeChatModel 등). None 이면 다음 사용 때 다시 생성."""
+    global _llm
+    with _llm_lock:
+        _llm = model
+
+def __getattr__(name):
+    # `from rag_llm import llm` 호환
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module 'rag_llm' has no attribute {name!r}")
+
+# ---------------------------
+# Response cache (메모리 LRU + 디스크 SQLite)
+# ---------------------------
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "./llm_cache.sqlite")
+CACHE_MEM_SIZE = 1024              # 메모리 LRU 항목 수
+CACHE_DISK_SIZE = 50000            # 디스크 최대 항목 수
+CACHE_TTL = 7 * 24 * 3600          # 초 단위, 0 이하면 만료 없음
+
+def normalize_prompt(prompt: str) -> str:
+    # 들여쓰기/공백 차이로 캐시가 갈리지 않도록 정규화
+    lines = [" ".join(line.split()) for line in (prompt or "").strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+def cache_key(prompt: str, model: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE) -> str:
+    raw = f"{model}\x00{temperature}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(self, path: str = CACHE_PATH, mem_size: int = CACHE_MEM_SIZE,
+                 disk_size: int = CACHE_DISK_SIZE, ttl: float = CACHE_TTL):
+        self.path = path
+        self.mem_size = mem_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self._mem = OrderedDict()   # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _db(self):
+        if self._conn is None and self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, value: str):
+        self._mem[key] = (created_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_size:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if not self._expired(item[0], now):
+                    self._mem.move_to_end(key)
+                    self.stats["mem_hits"] += 1
+                    return item[1]
+                del self._mem[key]
+
+            db = self._db()
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        db.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        db.commit()
+                        self._remember(key, created_at, value)
+                        self.stats["disk_hits"] += 1
+                        return value
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
 
-def llm_chat(prompt: str) -> str:
-    return llm.invoke(prompt).content
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self.stats["writes"] += 1
+            db = self._db()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db, now: float):
+        if self.ttl > 0:
+            cur = db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self.stats["evictions"] += max(cur.rowcount, 0)
+        n = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if n > self.disk_size:
+            # 가장 오래 안 쓰인 것부터 삭제
+            cur = db.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (n - self.disk_size,)
+            )
+            self.stats["evictions"] += max(cur.rowcount, 0)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["mem_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+llm_cache = LLMCache()
+
+def current_cache_key(prompt: str) -> str:
+    # set_llm 으로 바꾼 모델(fake 등)의 응답이 실제 모델 캐시에 섞이지 않도록 현재 모델 기준
+    model = get_llm()
+    return cache_key(
+        prompt,
+        model=getattr(model, "model_name", None) or LLM_MODEL,
+        temperature=getattr(model, "temperature", LLM_TEMPERATURE),
+    )
+
+def llm_chat(prompt: str, use_cache: bool = False) -> str:
+    if not use_cache:
+        out = get_llm().invoke(prompt).content
+        tracing.annotate(cache_hit=False, response_chars=len(out or ""))
+        return out
+
+    key = current_cache_key(prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        tracing.annotate(cache_hit=True, response_chars=len(cached))
+        return cached
+
+    out = get_llm().invoke(prompt).content
+    if out and out.strip():
+        llm_cache.set(key, out)
+    tracing.annotate(cache_hit=False, response_chars=len(out or ""))
+    return out
 
 def llm_chat_stream(prompt: str):
-    for chunk in llm.stream(prompt):
+    for chunk in get_llm().stream(prompt):
+        if chunk.content:
+            yield chunk.content
+
+# ---------------------------
+# Async (HTTP 서버용)
+# ---------------------------
+async def allm_chat(prompt: str, use_cache: bool = False) -> str:
+    if not use_cache:
+        out = (await get_llm().ainvoke(prompt)).content
+        tracing.annotate(cache_hit=False, response_chars=len(out or ""))
+        return out
+
+    key = current_cache_key(prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        tracing.annotate(cache_hit=True, response_chars=len(cached))
+        return cached
+
+    out = (await get_llm().ainvoke(prompt)).content
+    if out and out.strip():
+        llm_cache.set(key, out)
+    tracing.annotate(cache_hit=False, response_chars=len(out or ""))
+    return out
+
+async def allm_chat_stream(prompt: str):
+    async for chunk in get_llm().astream(prompt):
         if chunk.content:
             yield chunk.content
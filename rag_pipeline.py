@@ -1,9 +1,22 @@
 # rag_pipeline.py
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import asyncio
+import json
 import re
+import time
 
-from rag_llm import llm_chat, llm_chat_stream
-from retriever import retriever
+import numpy as np
+
+from rag_llm import llm_chat, llm_chat_stream, allm_chat, allm_chat_stream
+from retriever import get_retriever, filtered_search, get_by_ids, FILTER_START_K
+from ingredient_index import load_index
+from recipe_store import get_recipe
+from context_builder import build_context, count_tokens, RECIPE_TOKEN_BUDGET
+import tracing
+from tracing import span
+from features import doc_features, expand_user_ingredients, ingredient_hits
 
 # ---------------------------
 # Language detect
@@ -34,6 +47,12 @@ Behavior rules:
 - If Korean terms are used, explain briefly
 """
 
+# 레시피 프롬프트용 짧은 persona (형식/규칙은 프롬프트 아래쪽 Output format / Rules 에 이미 있음)
+PERSONA_RECIPE = """
+You are 'K-recipe', a friendly Korean food guide for foreigners in Korea who are
+beginners at cooking and new to Korean ingredients. Be empathetic, short and practical.
+"""
+
 # ---------------------------
 # Helpers: parse user inputs
 # ---------------------------
@@ -43,41 +62,30 @@ def parse_ingredients(text: str) -> List[str]:
     items = re.split(r"[,/\\|\n]+", text)
     return [i.strip() for i in items if i.strip()]
 
-def normalize_level(level: str) -> str:
-    return (level or "").strip()
-
-def time_to_minutes(time_str: str) -> int:
-    if not time_str:
-        return 9999
-    t = time_str.strip()
-    if "정보" in t:
-        return 9999
-    m = re.search(r"(\d+)\s*분", t)
-    if m:
-        return int(m.group(1))
-    return 9999
-
 # ---------------------------
 # Scoring (🔥 learned weights applied)
 # ---------------------------
+# ===== learned global weights =====
+W_ING   = 0.33859927
+W_LEVEL = 0.05387508
+W_POP   = 1.31745312
+W_STYLE = 1.51460502
+P_TIME  = 0.01022766
+
 def score_doc(doc, user_ings: List[str], style_hint: str) -> Tuple[float, Dict]:
     md = doc.metadata or {}
     text = doc.page_content or ""
 
-    level = normalize_level(md.get("level", ""))
-    views = int(md.get("views", 0) or 0)
-    cook_time = time_to_minutes(md.get("time", ""))
-
-    ing_hit = sum(1 for ing in user_ings if ing in text)
+    # 빌드 때 미리 계산한 피처 사용 (예전 인덱스면 여기서 파싱)
+    f = doc_features(md)
+    level = f["level"]
+    views = f["views"]
+    cook_time = f["cook_time"]
 
-    if level in ["초급", "아무나", "쉬움", "Easy"]:
-        level_score = 5
-    elif level == "중급":
-        level_score = 2
-    else:
-        level_score = 0
+    ing_hit = ingredient_hits(f["ingredients"], text, user_ings)
 
-    pop_score = min(5.0, views / 5000.0)
+    level_score = f["level_score"]
+    pop_score = f["pop_score"]
 
     style_score = 0
     if style_hint and style_hint != "상관없음":
@@ -91,19 +99,12 @@ def score_doc(doc, user_ings: List[str], style_hint: str) -> Tuple[float, Dict]:
     else:
         time_penalty = 1.5
 
-    # ===== learned global weights =====
-    w_ing   = 0.33859927
-    w_level = 0.05387508
-    w_pop   = 1.31745312
-    w_style = 1.51460502
-    p_time  = 0.01022766
-
     final = (
-        w_ing   * ing_hit
-      + w_level * level_score
-      + w_pop   * pop_score
-      + w_style * style_score
-      - p_time  * time_penalty
+        W_ING   * ing_hit
+      + W_LEVEL * level_score
+      + W_POP   * pop_score
+      + W_STYLE * style_score
+      - P_TIME  * time_penalty
     )
 
     return final, {
@@ -114,11 +115,118 @@ def score_doc(doc, user_ings: List[str], style_hint: str) -> Tuple[float, Dict]:
         "final": final
     }
 
+# ---------------------------
+# Vectorized scoring (score_doc 과 동일 결과, 후보 묶음 단위로 계산)
+# ---------------------------
+USE_VECTORIZED_SCORING = True
+
+def numeric_features(mds: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(cook_time, level_score, pop_score) 배열. 미리 계산된 metadata 는 그대로, 예전 인덱스만 파싱."""
+    cook, level, pop = [], [], []
+    for md in mds:
+        c, lv, p = md.get("cook_minutes"), md.get("level_score"), md.get("pop_score")
+        if c is None or lv is None or p is None:
+            f = doc_features(md)
+            c, lv, p = f["cook_time"], f["level_score"], f["pop_score"]
+        cook.append(c)
+        level.append(lv)
+        pop.append(p)
+    return (np.asarray(cook, dtype=np.float64), np.asarray(level, dtype=np.float64),
+            np.asarray(pop, dtype=np.float64))
+
+def ingredient_hit_counts(docs: List, mds: List[Dict], user_ings: List[str]) -> np.ndarray:
+    # 부분 문자열 검사는 np.char 보다 파이썬 `in` 이 빠름
+    # metadata 의 재료 목록은 콤마로 이어진 문자열이라 그대로 찾아도 항목 경계를 넘지 않음
+    expanded = expand_user_ingredients(user_ings)
+    hits = []
+    for d, md in zip(docs, mds):
+        ings = md.get("ingredients")
+        if ings is None:
+            text = d.page_content or ""
+            hits.append(sum(1 for ing in user_ings if ing in text))
+        else:
+            ings = str(ings)
+            hits.append(sum(1 for toks in expanded if any(tok in ings for tok in toks)))
+    return np.asarray(hits, dtype=np.float64)
+
+def style_hits(docs: List, mds: List[Dict], style_hint: str) -> np.ndarray:
+    if not style_hint or style_hint == "상관없음":
+        return np.zeros(len(docs), dtype=bool)
+    return np.fromiter(
+        (style_hint in (d.page_content or "") or style_hint in str(md.get("situation", ""))
+         or style_hint in str(md.get("method", ""))
+         for d, md in zip(docs, mds)),
+        dtype=bool, count=len(docs),
+    )
+
+def score_docs_vectorized(docs: List, user_ings: List[str], style_hint: str) -> Tuple[np.ndarray, np.ndarray]:
+    """반환: (final 점수, ing_hit). debug dict 는 rank_docs 에서 top-k 만 만듦."""
+    n = len(docs)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+
+    mds = [d.metadata or {} for d in docs]
+    cook_time, level_score, pop_score = numeric_features(mds)
+    ing_hit = ingredient_hit_counts(docs, mds, user_ings)
+    style_score = np.where(style_hits(docs, mds, style_hint), 1.5, 0.0)
+    time_penalty = np.where(cook_time <= 30, 0.0, np.where(cook_time <= 60, 0.5, 1.5))
+
+    final = (
+        W_ING   * ing_hit
+      + W_LEVEL * level_score
+      + W_POP   * pop_score
+      + W_STYLE * style_score
+      - P_TIME  * time_penalty
+    )
+    return final, ing_hit
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """점수 내림차순 top-k. 동점은 원래 순서 유지 (list.sort(reverse=True) 와 동일)."""
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+        thresh = scores[part].min()
+        above = np.flatnonzero(scores > thresh)
+        ties = np.flatnonzero(scores == thresh)[:k - len(above)]
+        cand = np.concatenate([above, ties])
+    else:
+        cand = np.arange(n)
+    return cand[np.lexsort((cand, -scores[cand]))]
+
+def rank_docs(docs: List, user_ings: List[str], style_hint: str, top_k: int = 5,
+              vectorized: bool = None) -> List[Tuple[float, object, Dict]]:
+    if vectorized is None:
+        vectorized = USE_VECTORIZED_SCORING
+
+    if not vectorized:
+        scored = []
+        for d in docs:
+            s, dbg = score_doc(d, user_ings, style_hint)
+            scored.append((s, d, dbg))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:top_k]
+
+    scores, ing_hit = score_docs_vectorized(docs, user_ings, style_hint)
+    out = []
+    for i in top_k_indices(scores, top_k):
+        f = doc_features(docs[i].metadata or {})
+        final = float(scores[i])
+        out.append((final, docs[i], {
+            "ing_hit": int(ing_hit[i]),
+            "level": f["level"],
+            "views": f["views"],
+            "cook_time": f["cook_time"],
+            "final": final,
+        }))
+    return out
+
 # ---------------------------
 # Title rewrite
 # ---------------------------
-def make_witty_title(raw_title: str, user_story: str, language: str) -> str:
-    prompt = f"""
+def title_prompt(raw_title: str, user_story: str, language: str) -> str:
+    return f"""
 You rename Korean dish titles into short, witty but clear titles.
 Rules:
 - Keep the original dish recognizable
@@ -130,17 +238,146 @@ Language: {language}
 Original dish: {raw_title}
 User mood: {user_story}
 """
+
+def make_witty_title(raw_title: str, user_story: str, language: str,
+                     use_cache: bool = True) -> str:
+    prompt = title_prompt(raw_title, user_story, language)
+    with span("llm.title", raw_title=raw_title, prompt_chars=len(prompt)) as s:
+        try:
+            out = llm_chat(prompt, use_cache=use_cache).strip()
+            s.set(response_chars=len(out), fallback=not out)
+            return out if out else raw_title
+        except Exception as e:
+            # 실패해도 raw_title 로 대체하되 span 에는 에러를 남김
+            s.record_error(e)
+            s.set(fallback=True)
+            return raw_title
+
+TITLE_MODES = ["serial", "concurrent", "batched", "none"]
+TITLE_TIMEOUT = 8.0   # 제목 생성 전체에 허용하는 시간(초)
+
+def _make_titles_concurrent(raw_titles: List[str], user_story: str, language: str,
+                            timeout: float) -> List[str]:
+    pool = ThreadPoolExecutor(max_workers=max(1, len(raw_titles)))
+    futures = [pool.submit(tracing.bind(make_witty_title), t, user_story, language) for t in raw_titles]
+    # 전체 대기 시간을 timeout 으로 제한 (호출별 지연을 합산하지 않음)
+    wait(futures, timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    titles = []
+    for raw, f in zip(raw_titles, futures):
+        if f.done() and not f.cancelled() and f.exception() is None:
+            titles.append(f.result() or raw)
+        else:
+            titles.append(raw)
+    return titles
+
+def batched_title_prompt(raw_titles: List[str], user_story: str, language: str) -> str:
+    numbered = "\n".join(f"{i+1}. {t}" for i, t in enumerate(raw_titles))
+    return f"""
+You rename Korean dish titles into short, witty but clear titles.
+Rules:
+- Keep the original dish recognizable
+- Max 12 words each
+- No clickbait, no insult
+- Output ONLY a JSON array of {len(raw_titles)} strings, same order as the input
+
+Language: {language}
+Original dishes:
+{numbered}
+User mood: {user_story}
+"""
+
+def parse_batched_titles(out: str, raw_titles: List[str]) -> List[str]:
+    m = re.search(r"\[.*\]", out or "", re.S)
     try:
-        out = llm_chat(prompt).strip()
-        return out if out else raw_title
-    except Exception:
-        return raw_title
+        parsed = json.loads(m.group(0)) if m else []
+    except ValueError:
+        parsed = []
+    if not isinstance(parsed, list):
+        parsed = []
+
+    titles = []
+    for i, raw in enumerate(raw_titles):
+        t = parsed[i] if i < len(parsed) else ""
+        t = t.strip() if isinstance(t, str) else ""
+        titles.append(t if t else raw)
+    return titles
+
+def _make_titles_batched(raw_titles: List[str], user_story: str, language: str,
+                         timeout: float) -> List[str]:
+    prompt = batched_title_prompt(raw_titles, user_story, language)
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(tracing.bind(llm_chat), prompt, True)
+    with span("llm.titles_batched", prompt_chars=len(prompt)) as s:
+        try:
+            out = future.result(timeout=timeout)
+        except Exception as e:
+            s.record_error(e)
+            return list(raw_titles)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        s.set(response_chars=len(out or ""))
+    return parse_batched_titles(out, raw_titles)
+
+def make_witty_titles(raw_titles: List[str], user_story: str, language: str,
+                      mode: str = "concurrent", timeout: float = TITLE_TIMEOUT) -> List[str]:
+    """
+    여러 제목을 한 번에 생성.
+    - serial     : 기존 방식 (하나씩 순차 호출)
+    - concurrent : 스레드풀로 동시에 호출, 전체 시간 timeout 제한
+    - batched    : 한 번의 LLM 호출로 JSON 배열을 받아옴
+    - none       : LLM 호출 없이 raw_title 그대로 (평가용)
+    실패/시간초과 항목은 raw_title 로 대체.
+    """
+    if not raw_titles:
+        return []
+    if mode == "none":
+        return list(raw_titles)
+    with span("titles", mode=mode, count=len(raw_titles)) as s:
+        if mode == "batched":
+            titles = _make_titles_batched(raw_titles, user_story, language, timeout)
+        elif mode == "concurrent":
+            titles = _make_titles_concurrent(raw_titles, user_story, language, timeout)
+        else:
+            titles = [make_witty_title(t, user_story, language) for t in raw_titles]
+        s.set(fallbacks=sum(1 for raw, t in zip(raw_titles, titles) if raw == t))
+    return titles
 
 # ---------------------------
-# Menu suggestion (재료 1순위 적용)
+# Ingredient index candidates
 # ---------------------------
-def suggest_menus(user_story: str, ingredients: str, style_hint: str = "") -> List[Dict]:
+MAX_INDEX_CANDIDATES = 30
+
+def index_candidate_ids(user_ings: List[str], limit: int = MAX_INDEX_CANDIDATES) -> List[int]:
+    index = load_index()
+    if index is None or not user_ings:
+        return []
+    # 전부 포함(AND) 우선, 모자라면 하나라도 포함(OR)으로 채움. 각각 조회수 높은 순.
+    and_ids = index.candidates(user_ings, mode="and")
+    ids = index.rank(and_ids)
+    if len(ids) < limit:
+        ids += index.rank(index.candidates(user_ings, mode="or") - and_ids)
+    return ids[:limit]
+
+def needs_index_candidates(docs: List, search_info: Dict, min_results: int = 5) -> bool:
+    """
+    역색인 후보는 벡터 검색이 재료 조건을 못 채웠을 때만 보충.
+    (rank_docs 에는 쿼리 유사도 항이 없어서, 충분할 때 섞으면 관련 있는 결과를 밀어냄)
+    """
+    return bool(search_info.get("fallback")) or len(docs) < min_results
+
+def merge_index_candidates(docs: List, user_ings: List[str], store=None) -> List:
+    seen = {(d.metadata or {}).get("id") for d in docs}
+    ids = [i for i in index_candidate_ids(user_ings) if i not in seen]
+    return docs + get_by_ids(ids, store=store)
 
+# ---------------------------
+# Menu suggestion (재료 1순위 적용)
+# ---------------------------
+def retrieve_candidates(user_story: str, ingredients: str, style_hint: str = "",
+                        store=None, top_k: int = 5) -> Tuple[List, Dict]:
+    """검색 + 재료 필터 + 랭킹까지 (LLM 호출 없음). (top, search_info) 반환."""
     user_ings = parse_ingredients(ingredients)
 
     query = f"""
@@ -151,77 +388,176 @@ Find suitable Korean recipes.
 Beginner friendly.
 """.strip()
 
-    docs = retriever.invoke(query)
-
-    # 🥇 Ingredient hard filter
-    if user_ings:
-        filtered = [d for d in docs if any(ing in (d.page_content or "") for ing in user_ings)]
-    else:
-        filtered = docs
-
-    # fallback
-    if len(filtered) < 5:
-        filtered = docs
-
-    scored = []
-    for d in filtered:
-        s, dbg = score_doc(d, user_ings, style_hint)
-        scored.append((s, d, dbg))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = scored[:5]
+    # 🥇 Ingredient hard filter (벡터 DB 쿼리로 내려보냄, 부족하면 k 늘려 재검색)
+    start_k = getattr(store, "k", FILTER_START_K)
+    with span("retrieval", k=start_k, ingredients=len(user_ings)) as s:
+        filtered, search_info = filtered_search(query, user_ings, min_results=5,
+                                                start_k=start_k, store=store)
+        s.set(candidates=len(filtered), final_k=search_info["k"],
+              rounds=search_info["rounds"], fallback=search_info["fallback"])
+
+    # 🥈 재료 역색인 후보 병합 (동의어 정규화된 정확 매칭)
+    with span("index_merge") as s:
+        before = len(filtered)
+        if needs_index_candidates(filtered, search_info):
+            filtered = merge_index_candidates(filtered, user_ings, store=store)
+        s.set(added=len(filtered) - before, candidates=len(filtered))
+
+    with span("ranking", candidates=len(filtered), top_k=top_k):
+        top = rank_docs(filtered, user_ings, style_hint, top_k=top_k)
+    return top, search_info
+
+def raw_menu_title(doc) -> str:
+    md = doc.metadata or {}
+    return md.get("menu", "") or md.get("title", "") or "Unknown"
 
-    language = detect_language(user_story)
-    menus = []
-
-    for s, d, dbg in top:
-        md = d.metadata or {}
-        raw_title = md.get("menu", "") or md.get("title", "") or "Unknown"
-        
-        # ✅ 추가: 레시피일련번호 추출 (벡터 DB는 "id"로 저장)
-        recipe_id = md.get("id", "")
-
-        display_title = make_witty_title(raw_title, user_story, language)
-
-        tags = []
-        if md.get("level"):
-            tags.append(md["level"])
-        if md.get("method"):
-            tags.append(md["method"])
-        if md.get("time") and "정보" not in str(md.get("time")):
-            tags.append(md["time"])
-
-        if dbg["ing_hit"] >= 2:
-            meme = "재료 매칭 꽤 좋다. 오늘은 이걸로 간다."
-        elif md.get("views", 0) >= 5000:
-            meme = "검증된 인기 레시피 쪽으로 안전하게."
-        else:
-            meme = "부담 없는 선택. 실패 확률 낮추자."
+def menu_card(doc, dbg: Dict, raw_title: str, display_title: str, search_info: Dict) -> Dict:
+    md = doc.metadata or {}
 
-        menus.append({
-            "title": display_title,
-            "raw_title": raw_title,
-            "subtitle": md.get("title", ""),
-            "tags": tags[:3],
-            "spice": 3,
-            "meme": meme,
-            "debug": dbg,
-            "recipe_id": recipe_id  # ✅ 추가: 레시피ID 전달
-        })
+    # ✅ 추가: 레시피일련번호 추출 (벡터 DB는 "id"로 저장)
+    recipe_id = md.get("id", "")
+
+    tags = []
+    if md.get("level"):
+        tags.append(md["level"])
+    if md.get("method"):
+        tags.append(md["method"])
+    if md.get("time") and "정보" not in str(md.get("time")):
+        tags.append(md["time"])
+
+    if dbg["ing_hit"] >= 2:
+        meme = "재료 매칭 꽤 좋다. 오늘은 이걸로 간다."
+    elif md.get("views", 0) >= 5000:
+        meme = "검증된 인기 레시피 쪽으로 안전하게."
+    else:
+        meme = "부담 없는 선택. 실패 확률 낮추자."
+
+    return {
+        "title": display_title,
+        "raw_title": raw_title,
+        "subtitle": md.get("title", ""),
+        "tags": tags[:3],
+        "spice": 3,
+        "meme": meme,
+        "debug": {**dbg, "search_rounds": search_info["rounds"],
+                  "search_fallback": search_info["fallback"]},
+        "recipe_id": recipe_id  # ✅ 추가: 레시피ID 전달
+    }
 
-    return menus
+def suggest_menus(user_story: str, ingredients: str, style_hint: str = "",
+                  title_mode: str = "concurrent", store=None) -> List[Dict]:
+    """
+    store: 검색 대상 (기본 Chroma). hybrid_retriever.HybridRetriever 를 넘기면
+    BM25+벡터 RRF 결과를 더 작은 k 로 사용.
+    """
+    with span("suggest_menus", title_mode=title_mode) as s:
+        top, search_info = retrieve_candidates(user_story, ingredients, style_hint, store=store)
+
+        language = detect_language(user_story)
+        raw_titles = [raw_menu_title(d) for _, d, _ in top]
+        display_titles = make_witty_titles(raw_titles, user_story, language, mode=title_mode)
+        s.set(menus=len(top))
+
+        return [
+            menu_card(d, dbg, raw_title, display_title, search_info)
+            for (_, d, dbg), raw_title, display_title in zip(top, raw_titles, display_titles)
+        ]
+
+def suggest_menus_progressive(user_story: str, ingredients: str, style_hint: str = "",
+                              store=None, timeout: float = TITLE_TIMEOUT):
+    """
+    suggest_menus 의 generator 버전 (첫 카드까지 시간 단축용).
+    1) ("cards", menus)     : 랭킹 끝나자마자 raw_title 로 채운 카드 목록
+    2) ("title", i, title)  : 재치 제목이 하나 올 때마다 (도착 순서대로)
+    timeout 안에 못 온 제목은 raw_title 그대로 둠.
+    """
+    # yield 를 넘나드는 구간이라 span 을 직접 열고 닫음
+    root = tracing.start_span("suggest_menus", title_mode="progressive")
+    pool = None
+    try:
+        with tracing.use_span(root):
+            top, search_info = retrieve_candidates(user_story, ingredients, style_hint, store=store)
+
+        language = detect_language(user_story)
+        raw_titles = [raw_menu_title(d) for _, d, _ in top]
+        menus = [
+            menu_card(d, dbg, raw_title, raw_title, search_info)
+            for (_, d, dbg), raw_title in zip(top, raw_titles)
+        ]
+        root.set(menus=len(menus), first_cards_ms=root.elapsed_ms())
+        yield ("cards", menus)
+
+        if not raw_titles:
+            return
+        titles_span = tracing.start_span("titles", parent=root, mode="progressive", count=len(raw_titles))
+        pool = ThreadPoolExecutor(max_workers=len(raw_titles))
+        with tracing.use_span(titles_span):
+            futures = {
+                pool.submit(tracing.bind(make_witty_title), t, user_story, language): i
+                for i, t in enumerate(raw_titles)
+            }
+        arrived = 0
+        try:
+            for f in as_completed(futures, timeout=timeout):
+                i = futures[f]
+                if f.exception() is None and f.result():
+                    arrived += 1
+                    yield ("title", i, f.result())
+        except FuturesTimeoutError as e:
+            titles_span.record_error(e)
+        finally:
+            titles_span.end(arrived=arrived)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        root.end()
 
 # ---------------------------
 # Recipe generation (✅ 한국어 난이도 추가)
 # ---------------------------
-def recipe_stream(user_story: str, ingredients: str, picked_menu_title: str, 
-                  korean_level: str = "Normal", selected_recipe_id: str = ""):
+def recipe_context_docs(picked_menu_title: str, ingredients: str, selected_recipe_id: str = "",
+                        include_similar: bool = False, n: int = 3) -> List:
+    """
+    선택한 레시피ID 가 있으면 ID 로 바로 조회 (임베딩/ANN 검색 없음).
+    비슷한 레시피 context 는 include_similar=True 일 때만 검색해서 붙임.
+    """
+    with span("recipe_context", by_id=bool(selected_recipe_id)) as s:
+        picked_doc = get_recipe(selected_recipe_id) if selected_recipe_id else None
+        s.set(id_hit=picked_doc is not None)
+        if picked_doc is not None and not include_similar:
+            return [picked_doc]
+
+        query = f"요리명: {picked_menu_title}\nIngredients: {ingredients}\n"
+        docs = get_retriever(30).invoke(query)
+        s.set(searched=True, candidates=len(docs))
+    if picked_doc is None:
+        return docs[:n]
+
+    picked_id = picked_doc.metadata.get("id")
+    similar = [d for d in docs if d.metadata.get("id") != picked_id]
+    return [picked_doc] + similar[:n - 1]
+
+def recipe_prompt(user_story: str, ingredients: str, picked_menu_title: str,
+                  korean_level: str = "Normal", selected_recipe_id: str = "",
+                  include_similar: bool = False,
+                  token_budget: Optional[int] = None) -> Tuple[str, str]:
+    """
+    (prompt, recipe_id) 반환.
+    token_budget: context 토큰 예산 (None 이면 RECIPE_TOKEN_BUDGET).
+    0 이하이면 예전처럼 full persona + page_content 그대로 (비교용).
+    """
     language = detect_language(user_story)
+    budget = RECIPE_TOKEN_BUDGET if token_budget is None else token_budget
+
+    docs = recipe_context_docs(picked_menu_title, ingredients, selected_recipe_id, include_similar)
+    if budget > 0:
+        context, ctx_info = build_context(docs[:3], budget)
+        persona = PERSONA_RECIPE
+    else:
+        context = "\n\n".join([d.page_content for d in docs[:3]])
+        ctx_info = {"context_tokens": count_tokens(context), "budget": 0, "docs_used": len(docs[:3])}
+        persona = PERSONA_FOREIGN_BEGINNER
 
-    query = f"요리명: {picked_menu_title}\nIngredients: {ingredients}\n"
-    docs = retriever.invoke(query)
-    context = "\n\n".join([d.page_content for d in docs[:3]])
-    
     # ✅ 수정: 선택한 ID 우선 사용, 없으면 검색 결과 사용
     recipe_id = selected_recipe_id if selected_recipe_id else ""
     if not recipe_id and docs:
@@ -238,7 +574,7 @@ def recipe_stream(user_story: str, ingredients: str, picked_menu_title: str,
             korean_instruction = "\n- Use natural Korean including cooking terms\n- No need to explain common cooking vocabulary"
 
     prompt = f"""
-{PERSONA_FOREIGN_BEGINNER}
+{persona}
 
 Context (retrieved recipes):
 {context}
@@ -260,21 +596,57 @@ Rules:
 - No long paragraphs
 - If Korean ingredient appears, explain briefly
 """
-    
-    # ✅ 추가: 레시피 URL을 마지막에 추가
-    for chunk in llm_chat_stream(prompt):
-        yield chunk
-    
-    # ✅ 추가: 레시피 바로가기 링크
-    if recipe_id:
-        yield f"\n\n---\n\n📖 **상세 레시피 보기**: [만개의레시피 바로가기](https://www.10000recipe.com/recipe/{recipe_id})"
+    # 요청별 프롬프트 토큰 수 기록 (RAG_TRACE_PATH 로 JSONL 에 쌓임)
+    tracing.annotate(prompt_tokens=count_tokens(prompt), **ctx_info)
+    return prompt, recipe_id
+
+def recipe_link(recipe_id) -> str:
+    return f"\n\n---\n\n📖 **상세 레시피 보기**: [만개의레시피 바로가기](https://www.10000recipe.com/recipe/{recipe_id})"
+
+def recipe_stream(user_story: str, ingredients: str, picked_menu_title: str, 
+                  korean_level: str = "Normal", selected_recipe_id: str = "",
+                  include_similar: bool = False):
+    # yield 를 넘나드는 구간이라 span 을 직접 열고 닫음
+    root = tracing.start_span("recipe_stream", by_id=bool(selected_recipe_id),
+                              include_similar=include_similar)
+    try:
+        with tracing.use_span(root), span("recipe_prompt") as s:
+            prompt, recipe_id = recipe_prompt(user_story, ingredients, picked_menu_title,
+                                              korean_level, selected_recipe_id, include_similar)
+            s.set(prompt_chars=len(prompt))
+
+        llm_span = tracing.start_span("llm.stream", parent=root, prompt_chars=len(prompt))
+        chunks = 0
+        chars = 0
+        try:
+            # ✅ 추가: 레시피 URL을 마지막에 추가
+            for chunk in llm_chat_stream(prompt):
+                if chunks == 0:
+                    llm_span.set(ttft_ms=llm_span.elapsed_ms())
+                chunks += 1
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            llm_span.record_error(e)
+            root.record_error(e)
+            raise
+        finally:
+            llm_span.end(chunks=chunks, response_chars=chars)
+
+        # ✅ 추가: 레시피 바로가기 링크
+        if recipe_id:
+            yield recipe_link(recipe_id)
+    finally:
+        root.end()
 
 # ---------------------------
 # Empathy message
 # ---------------------------
-def empathize_story(user_story: str) -> str:
+EMPATHY_FALLBACK = "That sounds like a long day. Let's fix it with food. What ingredients do you have?"
+
+def empathy_prompt(user_story: str) -> str:
     language = detect_language(user_story)
-    prompt = f"""
+    return f"""
 {PERSONA_FOREIGN_BEGINNER}
 
 Task:
@@ -289,9 +661,136 @@ Rules:
 User situation:
 {user_story}
 """
-    try:
-        return llm_chat(prompt).strip()
-    except Exception:
-        return "That sounds like a long day. Let's fix it with food. What ingredients do you have?"
+
+def empathize_story(user_story: str, use_cache: bool = True) -> str:
+    prompt = empathy_prompt(user_story)
+    with span("empathize_story", prompt_chars=len(prompt)) as s:
+        try:
+            out = llm_chat(prompt, use_cache=use_cache).strip()
+            s.set(response_chars=len(out))
+            return out
+        except Exception as e:
+            s.record_error(e)
+            s.set(fallback=True)
+            return EMPATHY_FALLBACK
     
     
+
+
+# ---------------------------
+# Async variants (HTTP 서버용: LLM 은 ainvoke/astream, 검색/랭킹은 스레드에서)
+# ---------------------------
+# span 은 contextvars 기반이라 task / to_thread 로 넘어가도 부모 아래로 기록됨
+async def amake_witty_title(raw_title: str, user_story: str, language: str,
+                            use_cache: bool = True) -> str:
+    prompt = title_prompt(raw_title, user_story, language)
+    with span("llm.title", raw_title=raw_title, prompt_chars=len(prompt)) as s:
+        try:
+            out = (await allm_chat(prompt, use_cache=use_cache)).strip()
+            s.set(response_chars=len(out), fallback=not out)
+            return out if out else raw_title
+        except Exception as e:
+            s.record_error(e)
+            s.set(fallback=True)
+            return raw_title
+
+async def amake_witty_titles(raw_titles: List[str], user_story: str, language: str,
+                             mode: str = "concurrent", timeout: float = TITLE_TIMEOUT) -> List[str]:
+    if not raw_titles:
+        return []
+    if mode == "none":
+        return list(raw_titles)
+    with span("titles", mode=mode, count=len(raw_titles)) as s:
+        if mode == "batched":
+            prompt = batched_title_prompt(raw_titles, user_story, language)
+            with span("llm.titles_batched", prompt_chars=len(prompt)) as ls:
+                try:
+                    out = await asyncio.wait_for(allm_chat(prompt, use_cache=True), timeout)
+                    ls.set(response_chars=len(out or ""))
+                    titles = parse_batched_titles(out, raw_titles)
+                except Exception as e:
+                    ls.record_error(e)
+                    titles = list(raw_titles)
+        else:
+            tasks = [asyncio.ensure_future(amake_witty_title(t, user_story, language)) for t in raw_titles]
+            # 전체 대기 시간을 timeout 으로 제한, 늦은 것은 취소하고 raw_title
+            await asyncio.wait(tasks, timeout=timeout)
+            titles = []
+            for raw, t in zip(raw_titles, tasks):
+                if t.done() and not t.cancelled() and t.exception() is None:
+                    titles.append(t.result() or raw)
+                else:
+                    t.cancel()
+                    s.incr("timeouts")
+                    titles.append(raw)
+        s.set(fallbacks=sum(1 for raw, t in zip(raw_titles, titles) if raw == t))
+    return titles
+
+async def asuggest_menus(user_story: str, ingredients: str, style_hint: str = "",
+                         title_mode: str = "concurrent", store=None) -> List[Dict]:
+    with span("suggest_menus", title_mode=title_mode, transport="async") as s:
+        top, search_info = await asyncio.to_thread(
+            retrieve_candidates, user_story, ingredients, style_hint, store
+        )
+        language = detect_language(user_story)
+        raw_titles = [raw_menu_title(d) for _, d, _ in top]
+        display_titles = await amake_witty_titles(raw_titles, user_story, language, mode=title_mode)
+        s.set(menus=len(top))
+        return [
+            menu_card(d, dbg, raw_title, display_title, search_info)
+            for (_, d, dbg), raw_title, display_title in zip(top, raw_titles, display_titles)
+        ]
+
+def _recipe_prompt_traced(*args) -> Tuple[str, str]:
+    with span("recipe_prompt") as s:
+        prompt, recipe_id = recipe_prompt(*args)
+        s.set(prompt_chars=len(prompt))
+    return prompt, recipe_id
+
+async def arecipe_stream(user_story: str, ingredients: str, picked_menu_title: str,
+                         korean_level: str = "Normal", selected_recipe_id: str = "",
+                         include_similar: bool = False):
+    # async generator 는 yield 사이에 context 가 유지되지 않으므로 span 을 직접 열고 닫음
+    root = tracing.start_span("recipe_stream", by_id=bool(selected_recipe_id),
+                              include_similar=include_similar, transport="async")
+    try:
+        with tracing.use_span(root):
+            # to_thread 는 현재 context 를 복사하므로 recipe_prompt span 이 root 아래로 들어감
+            prompt, recipe_id = await asyncio.to_thread(
+                _recipe_prompt_traced, user_story, ingredients, picked_menu_title,
+                korean_level, selected_recipe_id, include_similar
+            )
+
+        llm_span = tracing.start_span("llm.stream", parent=root, prompt_chars=len(prompt))
+        chunks = 0
+        chars = 0
+        try:
+            async for chunk in allm_chat_stream(prompt):
+                if chunks == 0:
+                    llm_span.set(ttft_ms=llm_span.elapsed_ms())
+                chunks += 1
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            llm_span.record_error(e)
+            root.record_error(e)
+            raise
+        finally:
+            llm_span.end(chunks=chunks, response_chars=chars)
+
+        if recipe_id:
+            yield recipe_link(recipe_id)
+    finally:
+        root.end()
+
+async def aempathize_story(user_story: str, use_cache: bool = True) -> str:
+    prompt = empathy_prompt(user_story)
+    with span("empathize_story", prompt_chars=len(prompt), transport="async") as s:
+        try:
+            out = (await allm_chat(prompt, use_cache=use_cache)).strip()
+            s.set(response_chars=len(out))
+            return out
+        except Exception as e:
+            s.record_error(e)
+            s.set(fallback=True)
+            return EMPATHY_FALLBACK
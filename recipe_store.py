@@ -0,0 +1,71 @@
+# recipe_store.py
+# 레시피ID → 문서 조회 (인덱스 빌드 때 같이 저장, 조회는 SQLite 기본키라 O(1) + 전체를 메모리에 안 올림)
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+RECIPE_STORE_PATH = "./recipe_docs.sqlite"
+
+def save_documents(documents: Iterable, path: str = RECIPE_STORE_PATH):
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute(
+        "CREATE TABLE recipe (id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO recipe (id, page_content, metadata) VALUES (?, ?, ?)",
+        (
+            (int(d.metadata["id"]), d.page_content, json.dumps(d.metadata, ensure_ascii=False))
+            for d in documents if d.metadata.get("id") is not None
+        ),
+    )
+    conn.commit()
+    conn.close()
+    # 빌드 도중 읽는 쪽이 깨진 파일을 보지 않도록 교체는 한 번에
+    os.replace(tmp, path)
+
+class RecipeStore:
+    def __init__(self, path: str = RECIPE_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def get(self, recipe_id) -> Optional[object]:
+        try:
+            rid = int(recipe_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_content, metadata FROM recipe WHERE id = ?", (rid,)
+            ).fetchone()
+        if row is None:
+            return None
+        from langchain.docstore.document import Document
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+_store = None
+
+def load_recipe_store(path: str = RECIPE_STORE_PATH) -> Optional[RecipeStore]:
+    global _store
+    if _store is None and os.path.exists(path):
+        _store = RecipeStore(path)
+    return _store
+
+def get_recipe(recipe_id):
+    """레시피ID 로 문서 1개. 저장소가 없으면 (예전 인덱스) Chroma 메타데이터 조회로 대체."""
+    if recipe_id in (None, ""):
+        return None
+    store = load_recipe_store()
+    if store is not None:
+        return store.get(recipe_id)
+    from retriever import get_by_ids
+    try:
+        docs = get_by_ids([int(recipe_id)])
+    except (TypeError, ValueError):
+        return None
+    return docs[0] if docs else None
@@ -0,0 +1,125 @@
+# resources.py
+# 임베딩 모델 / 벡터 스토어 / 리트리버를 프로세스당 한 번만 만드는 레지스트리 (처음 쓸 때 생성)
+import os
+import threading
+
+PERSIST_DIR = "./chroma_db"
+FAISS_DIR = "./faiss_db"
+EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+VECTOR_BACKENDS = ["chroma", "faiss"]
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+EMBED_ENCODERS = ["torch", "onnx", "onnx-int8"]
+EMBED_ENCODER = os.environ.get("EMBED_ENCODER", "torch")
+
+_lock = threading.RLock()
+_embeddings = {}     # (model_name, encoder) -> CachedEmbeddings
+_stores = {}         # (backend, persist_dir, model_name) -> Chroma / FaissStore
+_retrievers = {}     # (backend, persist_dir, model_name, k) -> retriever
+_hybrids = {}        # (backend, persist_dir, model_name, k) -> HybridRetriever
+
+def create_embedding(model_name: str = EMBED_MODEL, encoder: str = None,
+                     threads: int = None, batch_size: int = None):
+    """
+    캐시 없는 임베딩 모델 (인덱스 빌드 / 워커용).
+    encoder: "torch" (sentence-transformers) | "onnx" | "onnx-int8" (기본은 EMBED_ENCODER 환경변수)
+    """
+    encoder = encoder or EMBED_ENCODER
+    if encoder not in EMBED_ENCODERS:
+        raise ValueError(f"unknown encoder {encoder!r} (choose from {EMBED_ENCODERS})")
+    if encoder == "torch":
+        from langchain.embeddings import HuggingFaceEmbeddings
+        if threads:
+            import torch
+            torch.set_num_threads(max(1, threads))
+        kwargs = {"encode_kwargs": {"batch_size": batch_size}} if batch_size else {}
+        return HuggingFaceEmbeddings(model_name=model_name, **kwargs)
+    from onnx_encoder import OnnxEmbeddings, ENCODE_BATCH
+    return OnnxEmbeddings(model_name, quantized=encoder == "onnx-int8", threads=threads,
+                          batch_size=batch_size or ENCODE_BATCH)
+
+def get_embedding(model_name: str = EMBED_MODEL, encoder: str = None):
+    encoder = encoder or EMBED_ENCODER
+    key = (model_name, encoder)
+    with _lock:
+        if key not in _embeddings:
+            from retriever import CachedEmbeddings
+            _embeddings[key] = CachedEmbeddings(
+                create_embedding(model_name, encoder),
+                model_name=model_name,
+                variant="" if encoder == "torch" else encoder
+            )
+        return _embeddings[key]
+
+def _resolve(backend, persist_dir):
+    backend = backend or VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"unknown vector backend {backend!r} (choose from {VECTOR_BACKENDS})")
+    return backend, persist_dir or (FAISS_DIR if backend == "faiss" else PERSIST_DIR)
+
+def get_vectorstore(persist_dir: str = None, model_name: str = EMBED_MODEL, backend: str = None):
+    """backend: "chroma" | "faiss" (기본은 VECTOR_BACKEND 환경변수). persist_dir 기본값은 backend 별."""
+    backend, persist_dir = _resolve(backend, persist_dir)
+    key = (backend, persist_dir, model_name)
+    with _lock:
+        if key not in _stores:
+            if backend == "faiss":
+                from faiss_store import FaissStore
+                _stores[key] = FaissStore(persist_dir, embedding_function=get_embedding(model_name))
+            else:
+                from langchain.vectorstores import Chroma
+                _stores[key] = Chroma(
+                    persist_directory=persist_dir,
+                    embedding_function=get_embedding(model_name)
+                )
+        return _stores[key]
+
+def get_retriever(k: int = 30, persist_dir: str = None, model_name: str = EMBED_MODEL,
+                  backend: str = None):
+    # k 가 달라도 같은 스토어(같은 모델 사본)를 공유
+    backend, persist_dir = _resolve(backend, persist_dir)
+    key = (backend, persist_dir, model_name, k)
+    with _lock:
+        if key not in _retrievers:
+            _retrievers[key] = get_vectorstore(persist_dir, model_name, backend).as_retriever(
+                search_kwargs={"k": k}
+            )
+        return _retrievers[key]
+
+def get_hybrid_retriever(k: int = 10, persist_dir: str = None, model_name: str = EMBED_MODEL,
+                         backend: str = None):
+    backend, persist_dir = _resolve(backend, persist_dir)
+    key = (backend, persist_dir, model_name, k)
+    with _lock:
+        if key not in _hybrids:
+            from hybrid_retriever import build_hybrid_retriever
+            _hybrids[key] = build_hybrid_retriever(
+                get_vectorstore(persist_dir, model_name, backend), k=k
+            )
+        return _hybrids[key]
+
+def loaded() -> dict:
+    """지금까지 생성된 리소스 (디버그/프로파일용)"""
+    return {
+        "embeddings": list(_embeddings),
+        "stores": list(_stores),
+        "retrievers": list(_retrievers),
+        "hybrids": list(_hybrids),
+    }
+
+# ---------------------------
+# Warm-up (앱 시작 시 백그라운드로 모델 로드 + 더미 임베딩/검색 1회)
+# ---------------------------
+WARM_UP_QUERY = "김치찌개"
+
+def warm_up(background: bool = True, k: int = 1):
+    def _run():
+        store = get_vectorstore()
+        get_embedding().base.embed_query(WARM_UP_QUERY)   # 캐시 우회, 모델 자체를 데움
+        store.similarity_search(WARM_UP_QUERY, k=k)
+
+    if not background:
+        _run()
+        return None
+    t = threading.Thread(target=_run, name="rag-warm-up", daemon=True)
+    t.start()
+    return t
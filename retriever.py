@@ -1,14 +1,193 @@
 # retriever.py
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 
-PERSIST_DIR = "./chroma_db"
-EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 
-embedding = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+import resources
+import tracing
+from resources import PERSIST_DIR, EMBED_MODEL
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "./embed_cache.sqlite")
+EMBED_CACHE_SIZE = 4096
 
-vectorstore = Chroma(
-    persist_directory=PERSIST_DIR,
-    embedding_function=embedding
-) 
-retriever = vectorstore.as_retriever(search_kwargs={"k": 30})
+# ---------------------------
+# Query embedding cache
+# ---------------------------
+class CachedEmbeddings:
+    """
+    embed_query 결과를 메모이즈하는 래퍼.
+    키에 모델 이름이 들어가므로 모델을 바꾸면 이전 벡터는 절대 재사용되지 않음.
+    embed_documents(인덱스 빌드)는 그대로 통과.
+    (langchain Embeddings 인터페이스와 같은 메서드만 구현 → import 시 langchain 을 안 불러옴)
+    """
+
+    def __init__(self, base, model_name: str, max_size: int = EMBED_CACHE_SIZE,
+                 path: str = EMBED_CACHE_PATH, variant: str = ""):
+        self.base = base
+        self.model_name = model_name
+        # 같은 모델이라도 ONNX/int8 벡터는 조금 다르므로 캐시 키를 분리 (torch 는 예전 키 그대로)
+        self.variant = variant
+        self._namespace = f"{model_name}#{variant}" if variant else model_name
+        self.max_size = max_size
+        self.path = path
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self._namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _db(self):
+        if self._conn is None and self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embedding ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, vec: List[float]):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_size:
+            self._mem.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.stats["mem_hits"] += 1
+                tracing.incr("embed_cache_hits")
+                return list(vec)
+
+            db = self._db()
+            if db is not None:
+                row = db.execute(
+                    "SELECT vector FROM query_embedding WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vec = array("f", row[0]).tolist()
+                    self._remember(key, vec)
+                    self.stats["disk_hits"] += 1
+                    tracing.incr("embed_cache_hits")
+                    return list(vec)
+
+            self.stats["misses"] += 1
+            tracing.incr("embed_cache_misses")
+
+        vec = list(self.base.embed_query(text))
+
+        with self._lock:
+            self._remember(key, vec)
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO query_embedding (key, model, vector) VALUES (?, ?, ?)",
+                    (key, self._namespace, array("f", vec).tobytes())
+                )
+                db.commit()
+        return list(vec)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def hit_rate(self) -> float:
+        hits = self.stats["mem_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+# ---------------------------
+# Shared resources (resources.py 레지스트리에서 처음 접근할 때 생성)
+# 벡터 스토어는 VECTOR_BACKEND=chroma|faiss 로 선택 (faiss 는 faiss_store.FaissStore,
+# 같은 similarity_search / get / as_retriever 인터페이스)
+# ---------------------------
+def __getattr__(name):
+    # `from retriever import retriever` 같은 기존 코드 호환
+    if name == "embedding":
+        return resources.get_embedding(EMBED_MODEL)
+    if name == "vectorstore":
+        return resources.get_vectorstore(model_name=EMBED_MODEL)
+    if name == "retriever":
+        return resources.get_retriever(30, model_name=EMBED_MODEL)
+    raise AttributeError(f"module 'retriever' has no attribute {name!r}")
+
+def get_vectorstore():
+    return resources.get_vectorstore(model_name=EMBED_MODEL)
+
+def get_retriever(k: int = 30):
+    return resources.get_retriever(k, model_name=EMBED_MODEL)
+
+# ---------------------------
+# Ingredient-filtered retrieval (adaptive deepening)
+# ---------------------------
+FILTER_START_K = 30
+FILTER_MAX_K = 240
+
+def ingredient_where_document(ingredients: List[str]) -> Dict:
+    conds = [{"$contains": ing} for ing in ingredients if ing]
+    if not conds:
+        return {}
+    if len(conds) == 1:
+        return conds[0]
+    return {"$or": conds}
+
+def filtered_search(query: str, ingredients: List[str], min_results: int = 5,
+                    start_k: int = FILTER_START_K, max_k: int = FILTER_MAX_K,
+                    store=None) -> Tuple[List, Dict]:
+    """
+    재료 조건을 Chroma where_document 로 내려보내 검색.
+    결과가 min_results 보다 적으면 k 를 두 배씩 늘려 재검색 (30 → 60 → 120 ...).
+    max_k 까지 가도 부족하면 필터 없는 결과로 fallback.
+    """
+    store = store or get_vectorstore()
+    where = ingredient_where_document(ingredients)
+    info = {"rounds": 0, "k": start_k, "filtered": bool(where), "fallback": False}
+
+    if not where:
+        info["rounds"] = 1
+        return store.similarity_search(query, k=start_k), info
+
+    k = start_k
+    docs = []
+    while True:
+        info["rounds"] += 1
+        info["k"] = k
+        docs = store.similarity_search(query, k=k, where_document=where)
+        # HNSW 필터 검색은 근사라서 k 가 작으면 조건 맞는 문서를 놓칠 수 있음
+        if len(docs) >= min_results or k >= max_k:
+            break
+        k = min(k * 2, max_k)
+
+    if len(docs) < min_results:
+        info["fallback"] = True
+        docs = store.similarity_search(query, k=start_k)
+    return docs, info
+
+# ---------------------------
+# Fetch by recipe id (역색인 후보용)
+# ---------------------------
+def get_by_ids(recipe_ids: List[int], store=None) -> List:
+    if not recipe_ids:
+        return []
+    from langchain.docstore.document import Document
+    store = store or get_vectorstore()
+    res = store.get(where={"id": {"$in": [int(i) for i in recipe_ids]}},
+                    include=["documents", "metadatas"])
+    return [
+        Document(page_content=text or "", metadata=md or {})
+        for text, md in zip(res.get("documents") or [], res.get("metadatas") or [])
+    ]
+
+# ---------------------------
+# Hybrid (BM25 + vector, RRF)
+# ---------------------------
+def get_hybrid_retriever(k: int = 10):
+    return resources.get_hybrid_retriever(k, model_name=EMBED_MODEL)
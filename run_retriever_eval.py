@@ -1,7 +1,14 @@
+import os
 import pandas as pd
 from retriever_eval import evaluate_retriever
 from eval_scenarios import SCENARIOS
-from retriever import retriever
+from retriever import get_retriever, get_hybrid_retriever
+
+# RETRIEVER=hybrid 이면 BM25+벡터 RRF 리트리버로 평가
+if os.environ.get("RETRIEVER") == "hybrid":
+    retriever = get_hybrid_retriever()
+else:
+    retriever = get_retriever(30)
 
 results = []
 
@@ -0,0 +1,159 @@
+# server.py
+# Streamlit 없이 파이프라인을 HTTP(ASGI)로 서빙. 레시피는 SSE 로 토큰 스트리밍.
+#   uvicorn server:app --port 8000
+#   (테스트) create_app(llm=FakeChatModel(latency=0.2))
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import rag_llm
+from rag_pipeline import aempathize_story, asuggest_menus, arecipe_stream
+
+MAX_CONCURRENCY = int(os.environ.get("RAG_MAX_CONCURRENCY", "16"))   # 동시에 처리할 요청 수
+MAX_QUEUE = int(os.environ.get("RAG_MAX_QUEUE", "64"))               # 대기열 길이 (넘으면 503)
+QUEUE_TIMEOUT = float(os.environ.get("RAG_QUEUE_TIMEOUT", "30"))     # 대기열에서 기다리는 최대 시간(초)
+
+# ---------------------------
+# Bounded concurrency + queue
+# ---------------------------
+class Limiter:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="server busy")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="queue timeout")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+# ---------------------------
+# Request bodies
+# ---------------------------
+class EmpathyRequest(BaseModel):
+    story: str
+
+class MenusRequest(BaseModel):
+    story: str
+    ingredients: str = ""
+    style: str = ""
+    title_mode: str = "concurrent"
+
+class RecipeRequest(BaseModel):
+    story: str
+    ingredients: str = ""
+    picked: str
+    korean_level: str = "Normal"
+    recipe_id: str = ""
+    include_similar: bool = False
+
+def sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# ---------------------------
+# App
+# ---------------------------
+def create_app(llm=None, limiter: Optional[Limiter] = None, warm_up: bool = False) -> FastAPI:
+    """
+    llm: 교체할 chat 모델 (예: fake_llm.FakeChatModel). None 이면 기본 OpenAI 모델.
+    """
+    if llm is not None:
+        rag_llm.set_llm(llm)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if warm_up:
+            import resources
+            resources.warm_up(background=True)
+        yield
+
+    app = FastAPI(title="K-recipe RAG", lifespan=lifespan)
+    app.state.limiter = limiter or Limiter()
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True, **app.state.limiter.stats()}
+
+    @app.post("/empathize")
+    async def empathize(req: EmpathyRequest):
+        lim = app.state.limiter
+        await lim.acquire()
+        try:
+            return {"message": await aempathize_story(req.story)}
+        finally:
+            lim.release()
+
+    @app.post("/menus")
+    async def menus(req: MenusRequest):
+        lim = app.state.limiter
+        await lim.acquire()
+        try:
+            return {"menus": await asuggest_menus(req.story, req.ingredients, req.style,
+                                                  title_mode=req.title_mode)}
+        finally:
+            lim.release()
+
+    @app.post("/recipe")
+    async def recipe(req: RecipeRequest):
+        lim = app.state.limiter
+        if lim.waiting >= lim.max_queue:
+            # 대기열이 이미 꽉 찼으면 스트림을 열기 전에 바로 503 (슬롯을 잡지 않으므로 샐 게 없음)
+            lim.rejected += 1
+            raise HTTPException(status_code=503, detail="server busy")
+
+        async def events():
+            # 슬롯은 스트림이 실제로 시작될 때 잡음. 본문이 시작되기 전에 클라이언트가 끊으면
+            # 이 generator 는 아예 실행되지 않으므로, 밖에서 잡으면 release 가 영영 안 불림.
+            try:
+                await lim.acquire()
+            except HTTPException as e:
+                # 응답 헤더(200)는 이미 나갔으므로 SSE error 이벤트로 알림
+                yield sse({"error": e.detail, "status": e.status_code}, event="error")
+                return
+            try:
+                async for chunk in arecipe_stream(req.story, req.ingredients, req.picked,
+                                                  korean_level=req.korean_level,
+                                                  selected_recipe_id=req.recipe_id,
+                                                  include_similar=req.include_similar):
+                    yield sse({"token": chunk})
+                yield sse({}, event="done")
+            except Exception as e:
+                yield sse({"error": f"{type(e).__name__}: {e}"}, event="error")
+            finally:
+                lim.release()
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    return app
+
+app = create_app(warm_up=True)
@@ -1,10 +1,21 @@
 # 6장/streamlit_chat.py
 import os
 import streamlit as st
-from rag_pipeline import suggest_menus, recipe_stream, empathize_story
+import resources
+import tracing
+from rag_pipeline import suggest_menus_progressive, empathize_story
+from prefetch import RecipePrefetcher, PREFETCH_TOP_N
 
 st.set_page_config(page_title="K-recipe", layout="wide")
 
+# ---- 모델/벡터 스토어: rerun 마다 새로 만들지 않고 프로세스당 한 번 ----
+# 사용자가 사연을 쓰는 동안 백그라운드로 모델 로드 + 더미 검색
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    return resources.warm_up(background=True)
+
+start_warm_up()
+
 # ---- API KEY 체크 (없으면 안내) ----
 if not os.environ.get("OPENAI_API_KEY"):
     st.warning("OPENAI_API_KEY가 설정되지 않았어. .env 또는 환경변수 설정 확인해줘.")
@@ -145,6 +156,83 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "korean_level" not in st.session_state:
     st.session_state.korean_level = "Normal"
+if "picked_id" not in st.session_state:
+    st.session_state.picked_id = ""
+if "recipe_cache" not in st.session_state:
+    st.session_state.recipe_cache = {}   # (사연, 재료, 메뉴, 한국어 난이도, 레시피ID) -> 생성된 레시피
+if "regenerate_recipe" not in st.session_state:
+    st.session_state.regenerate_recipe = False
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = RecipePrefetcher()
+if "prefetch_enabled" not in st.session_state:
+    st.session_state.prefetch_enabled = False
+if "menus_pending" not in st.session_state:
+    st.session_state.menus_pending = False
+if "debug_panel" not in st.session_state:
+    st.session_state.debug_panel = False
+
+
+def render_card(placeholder, m):
+    placeholder.markdown(f"""
+    <div class="card">
+      <div>
+        <div class="card-title">{m.get("title","")}</div>
+        <div class="card-sub">{m.get("subtitle","")}</div>
+        <div style="margin-top:10px;">
+          {''.join([f'<span class="tag">{t}</span>' for t in (m.get("tags") or [])[:3]])}
+        </div>
+        <div class="meme">{m.get("meme","")}</div>
+      </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_trace(spans):
+    """span 목록을 워터폴(시작 offset + 소요시간 막대)로 표시"""
+    if not spans:
+        st.caption("아직 기록된 요청이 없어요")
+        return
+    depth = {}
+    for sp in spans:
+        depth[sp["span_id"]] = depth.get(sp["parent_id"], -1) + 1
+    total = max((sp["offset_ms"] + (sp["duration_ms"] or 0.0)) for sp in spans) or 1.0
+    width = 20
+    lines = []
+    for sp in spans:
+        dur = sp["duration_ms"] or 0.0
+        start = int(sp["offset_ms"] / total * width)
+        bar = " " * start + "█" * max(1, int(dur / total * width))
+        lines.append(f"{'  ' * depth[sp['span_id']]}{sp['name']:<18} |{bar:<{width}}| {dur:8.1f}ms")
+    st.code("\n".join(lines), language=None)
+    for sp in spans:
+        attrs = ", ".join(f"{k}={v}" for k, v in sp["attrs"].items())
+        err = f"  ⚠️ {sp['error']}" if sp["error"] else ""
+        if attrs or err:
+            st.caption(f"**{sp['name']}** {attrs}{err}")
+
+
+KOREAN_LEVELS = ["Easy", "Normal", "Advanced"]
+
+
+def make_recipe_key(picked, picked_id, level=None):
+    return (
+        st.session_state.story,
+        st.session_state.ingredients,
+        picked,
+        level or st.session_state.korean_level,
+        str(picked_id or ""),
+    )
+
+
+def cached_other_level(picked, picked_id):
+    """같은 메뉴를 다른 한국어 난이도로 만든 레시피 → (난이도, 레시피) 또는 None"""
+    for level in KOREAN_LEVELS:
+        if level == st.session_state.korean_level:
+            continue
+        text = st.session_state.recipe_cache.get(make_recipe_key(picked, picked_id, level))
+        if text is not None:
+            return level, text
+    return None
 
 
 def reset_all():
@@ -155,6 +243,8 @@ def reset_all():
     st.session_state.style = "상관없음"
     st.session_state.menus = []
     st.session_state.picked = None
+    st.session_state.picked_id = ""
+    st.session_state.prefetcher.cancel_all()
     st.rerun()
 
 # ---- sidebar ----
@@ -168,10 +258,32 @@ with st.sidebar:
     )
     st.selectbox(
         "Korean Explanation Level",
-        ["Easy", "Normal", "Advanced"],
+        KOREAN_LEVELS,
         key="korean_level",
         help="Controls how simple the Korean explanation is"
     )
+    st.checkbox(
+        "레시피 미리 준비하기",
+        key="prefetch_enabled",
+        help="메뉴 카드를 보는 동안 상위 메뉴 레시피를 미리 만들어 둬요 (LLM 호출이 늘어남)"
+    )
+    if st.session_state.prefetch_enabled:
+        pf = st.session_state.prefetcher
+        st.caption(f"prefetch 적중률: {pf.hit_rate():.0%}  "
+                   f"(hit {pf.stats['hits']} / miss {pf.stats['misses']})")
+    st.checkbox(
+        "디버그 패널",
+        key="debug_panel",
+        help="마지막 요청의 단계별 소요시간 / 후보 수 / 캐시 적중 / 에러"
+    )
+    if st.session_state.debug_panel:
+        # prefetch 같은 background trace 는 목록 뒤로 (기본 선택은 사용자 요청)
+        names = tracing.memory_sink.request_names()
+        if names:
+            name = st.selectbox("요청", names, key="debug_trace_name")
+            render_trace(tracing.last_trace(name))
+        else:
+            render_trace([])
     if st.button("처음으로 돌아가기", use_container_width=True):
         reset_all()
 
@@ -283,12 +395,9 @@ elif st.session_state.stage == "style":
     with col2:
         if st.button("메뉴 후보 보기", use_container_width=True):
             st.session_state.style = style
-            with st.spinner("메뉴 후보 만드는 중..."):
-                st.session_state.menus = suggest_menus(
-                    st.session_state.story,
-                    st.session_state.ingredients,
-                    st.session_state.style
-                )
+            # 카드는 menus 단계에서 랭킹 끝나자마자 먼저 그리고, 제목은 도착하는 대로 채움
+            st.session_state.menus = []
+            st.session_state.menus_pending = True
             st.session_state.stage = "menus"
             st.rerun()
 
@@ -300,6 +409,17 @@ elif st.session_state.stage == "menus":
     st.subheader("이 상황엔… 이 메뉴들이 딱이야")
     st.caption("하나 고르면 레시피는 핵심만 딱 보여줄게.")
 
+    title_updates = None
+    if st.session_state.menus_pending:
+        st.session_state.menus_pending = False
+        with st.spinner("메뉴 후보 만드는 중..."):
+            title_updates = suggest_menus_progressive(
+                st.session_state.story,
+                st.session_state.ingredients,
+                st.session_state.style
+            )
+            _, st.session_state.menus = next(title_updates)
+
     menus = st.session_state.menus or []
     if not menus:
         st.warning("후보를 못 뽑았어. 다시 시도해볼까?")
@@ -309,44 +429,54 @@ elif st.session_state.stage == "menus":
         st.stop()
 
     cols = st.columns(2, gap="large")
+    card_slots = []
     for i, m in enumerate(menus):
         c = cols[i % 2]
         with c:
-            st.markdown(f"""
-            <div class="card">
-              <div>
-                <div class="card-title">{m.get("title","")}</div>
-                <div class="card-sub">{m.get("subtitle","")}</div>
-                <div style="margin-top:10px;">
-                  {''.join([f'<span class="tag">{t}</span>' for t in (m.get("tags") or [])[:3]])}
-                </div>
-                <div class="meme">{m.get("meme","")}</div>
-              </div>
-            </div>
-            """, unsafe_allow_html=True)
+            slot = st.empty()
+            render_card(slot, m)
+            card_slots.append(slot)
 
             spice = max(1, min(5, int(m.get("spice", 3))))
             spice_bar = "🌶️" * spice
             if st.button(f"{spice_bar}  이 메뉴로 간다", key=f"pick_{i}", use_container_width=True):
                 st.session_state.picked = m.get("raw_title") or m.get("title")
+                st.session_state.picked_id = str(m.get("recipe_id") or "")
                 st.session_state.stage = "recipe"
                 st.rerun()
 
+    # --- 카드 보는 동안 상위 메뉴 레시피 미리 생성 ---
+    if st.session_state.prefetch_enabled:
+        for m in menus[:PREFETCH_TOP_N]:
+            raw = m.get("raw_title") or m.get("title")
+            key = make_recipe_key(raw, m.get("recipe_id"))
+            if key not in st.session_state.recipe_cache:
+                st.session_state.prefetcher.prefetch(
+                    key,
+                    st.session_state.story,
+                    st.session_state.ingredients,
+                    raw,
+                    korean_level=st.session_state.korean_level,
+                    selected_recipe_id=str(m.get("recipe_id") or "")
+                )
+
     st.markdown('<div class="hr"></div>', unsafe_allow_html=True)
     col1, col2 = st.columns([1,1])
     with col1:
         if st.button("다른 후보 다시 뽑기", use_container_width=True):
-            with st.spinner("다시 추천 중..."):
-                st.session_state.menus = suggest_menus(
-                    st.session_state.story,
-                    st.session_state.ingredients,
-                    st.session_state.style
-                )
+            st.session_state.prefetcher.cancel_all()
+            st.session_state.menus_pending = True
             st.rerun()
     with col2:
         if st.button("처음으로 돌아가기", use_container_width=True):
             reset_all()
 
+    # --- 재치 제목은 도착하는 대로 카드에 채움 ---
+    if title_updates is not None:
+        for _, i, title in title_updates:
+            st.session_state.menus[i]["title"] = title
+            render_card(card_slots[i], st.session_state.menus[i])
+
 # ---- stage: recipe ----
 elif st.session_state.stage == "recipe":
     picked = st.session_state.picked
@@ -360,12 +490,20 @@ elif st.session_state.stage == "recipe":
     st.subheader(f"선택 메뉴: {picked}")
     st.caption("레시피는 핵심만 보여줄게.")
 
-    col1, col2 = st.columns([1,1])
+    recipe_key = make_recipe_key(picked, st.session_state.picked_id)
+
+    col1, col2, col3 = st.columns([1,1,1])
     with col1:
         if st.button("메뉴 다시 고르기", use_container_width=True):
             st.session_state.stage = "menus"
             st.rerun()
     with col2:
+        # 재생성은 이 버튼을 눌렀을 때만 (rerun / 난이도 변경마다 LLM 다시 안 부름)
+        if st.button("레시피 다시 만들기", use_container_width=True):
+            st.session_state.recipe_cache.pop(recipe_key, None)
+            st.session_state.regenerate_recipe = True
+            st.rerun()
+    with col3:
         if st.button("처음으로 돌아가기", use_container_width=True):
             reset_all()
 
@@ -376,18 +514,41 @@ elif st.session_state.stage == "recipe":
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
     
-    # --- 새 assistant 응답 ---
-    with st.chat_message("assistant"):
-        response = st.write_stream(
-            recipe_stream(
-                st.session_state.story,
-                st.session_state.ingredients,
-                picked
+    # --- 새 assistant 응답 (이미 만든 레시피면 다시 생성하지 않고 캐시된 내용을 보여줌) ---
+    cached = st.session_state.recipe_cache.get(recipe_key)
+    other = None if cached is not None or st.session_state.regenerate_recipe \
+        else cached_other_level(picked, st.session_state.picked_id)
+    if cached is not None:
+        # 방금 만든 레시피는 위 히스토리 마지막에 이미 있음
+        messages = st.session_state.messages
+        if not messages or messages[-1]["content"] != cached:
+            with st.chat_message("assistant"):
+                st.markdown(cached)
+    elif other is not None:
+        # 난이도만 바뀐 경우 자동으로 다시 만들지 않고, 어떤 난이도로 만든 것인지 알려줌
+        level, text = other
+        st.warning(f"아래 레시피는 한국어 난이도 **{level}** 로 만든 거야. "
+                   f"**{st.session_state.korean_level}** 로 보려면 \"레시피 다시 만들기\" 를 눌러줘.")
+        with st.chat_message("assistant"):
+            st.markdown(text)
+    else:
+        st.session_state.regenerate_recipe = False
+        with st.chat_message("assistant"):
+            # prefetch 된 레시피면 버퍼된 토큰이 바로 나오고 이어서 실시간 스트림
+            response = st.write_stream(
+                st.session_state.prefetcher.stream(
+                    recipe_key,
+                    st.session_state.story,
+                    st.session_state.ingredients,
+                    picked,
+                    korean_level=st.session_state.korean_level,
+                    selected_recipe_id=st.session_state.picked_id
+                )
             )
-        )
-        
-    # --- 히스토리에 저장 ---
-    st.session_state.messages.append({
-        "role": "assistant",
-        "content": response
-    })
+        st.session_state.recipe_cache[recipe_key] = response
+
+        # --- 히스토리에 저장 ---
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": response
+        })
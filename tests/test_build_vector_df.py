@@ -0,0 +1,67 @@
+# 전체 재빌드가 기존 chroma_db 의 행을 남기지 않는지 (langchain / pandas / chromadb 필요)
+import os
+import sys
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("langchain")
+chromadb = pytest.importorskip("chromadb")
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import build_vector_df  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_chroma(tmp_path, monkeypatch):
+    # 빌드 스크립트의 경로는 전부 "./..." 상대 경로 → 테스트마다 빈 디렉터리에서 실행
+    monkeypatch.chdir(tmp_path)
+    # chromadb 는 경로 문자열로 클라이언트를 캐시하므로 테스트마다 비움
+    chromadb.api.client.SharedSystemClient.clear_system_cache()
+    yield
+    chromadb.api.client.SharedSystemClient.clear_system_cache()
+
+
+def _row(rid, menu):
+    return {
+        "레시피일련번호": rid, "레시피제목": f"{menu} 만들기", "요리명": menu, "조회수": 100,
+        "조리방법": "끓이기", "상황별분류": "일상", "레시피소개": f"{menu} 소개",
+        "재료내용": "[재료] 김치 1/4포기| 두부 반모", "인분": "2인분", "난이도": "초급",
+        "조리시간": "30분이내",
+    }
+
+
+def _stored_ids():
+    db = build_vector_df.Chroma(persist_directory=build_vector_df.PERSIST_DIR,
+                                embedding_function=DeterministicFakeEmbedding(size=16))
+    return sorted(db.get()["ids"])
+
+
+def test_full_rebuild_drops_removed_rows(monkeypatch):
+    monkeypatch.setattr(build_vector_df, "create_embedding",
+                        lambda *a, **k: DeterministicFakeEmbedding(size=16))
+
+    pd.DataFrame([_row(1, "김치찌개"), _row(2, "된장찌개"), _row(3, "라면")]).to_csv(
+        build_vector_df.CSV_PATH, index=False)
+    build_vector_df.main()
+    assert _stored_ids() == ["1", "2", "3"]
+
+    pd.DataFrame([_row(1, "김치찌개"), _row(3, "라면")]).to_csv(
+        build_vector_df.CSV_PATH, index=False)
+    build_vector_df.main()
+    assert _stored_ids() == ["1", "3"]
+
+
+def test_full_rebuild_drops_rows_with_old_ids(monkeypatch):
+    # 예전 빌드처럼 uuid id 로 들어간 행이 새 id 행과 같이 남으면 안 됨
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(build_vector_df, "create_embedding", lambda *a, **k: embedding)
+
+    old = build_vector_df.Chroma(persist_directory=build_vector_df.PERSIST_DIR,
+                                 embedding_function=embedding)
+    old.add_texts(["요리명: 김치찌개"], ids=["0f8c1d3e-uuid"])
+
+    pd.DataFrame([_row(1, "김치찌개")]).to_csv(build_vector_df.CSV_PATH, index=False)
+    build_vector_df.main()
+    assert _stored_ids() == ["1"]
@@ -0,0 +1,174 @@
+# tracing.py
+# 가벼운 구간(span) 측정: 단계별 소요시간 / 후보 수 / k / 캐시 적중 / 프롬프트·응답 크기 / 에러
+#   with span("retrieval", k=30) as s: ...; s.set(candidates=len(docs))
+# 루트 span 이 끝나면 그 요청의 span 전부를 sink 로 보냄 (기본: 메모리 + RAG_TRACE_PATH 있으면 JSONL)
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+TRACE_PATH = os.environ.get("RAG_TRACE_PATH", "")
+
+_current = contextvars.ContextVar("rag_current_span", default=None)
+_lock = threading.Lock()
+_open_traces: Dict[str, List["Span"]] = {}
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.root_start = parent.root_start if parent else time.time()
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.attrs = dict(attrs)
+        self.error = ""
+        with _lock:
+            _open_traces.setdefault(self.trace_id, []).append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, key: str, n: int = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+    def record_error(self, e: BaseException):
+        self.error = f"{type(e).__name__}: {e}"
+
+    def elapsed_ms(self) -> float:
+        """시작부터 지금까지 (첫 토큰 / 첫 카드 시각 기록용)"""
+        return round((time.perf_counter() - self._t0) * 1000.0, 3)
+
+    def end(self, **attrs):
+        if self.duration_ms is not None:
+            return
+        self.attrs.update(attrs)
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000.0
+        if self.parent is None:
+            with _lock:
+                spans = _open_traces.pop(self.trace_id, [])
+            _emit([s.to_dict() for s in spans])
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start,
+            "offset_ms": round((self.start - self.root_start) * 1000.0, 3),
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+# ---------------------------
+# API
+# ---------------------------
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+def start_span(name: str, parent: Optional[Span] = None, **attrs) -> Span:
+    """직접 end() 해야 하는 span (generator 처럼 yield 를 넘나드는 구간용)"""
+    return Span(name, parent if parent is not None else _current.get(), **attrs)
+
+@contextmanager
+def use_span(s: Span):
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name: str, **attrs):
+    s = start_span(name, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+def annotate(**attrs):
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+def incr(key: str, n: int = 1):
+    s = _current.get()
+    if s is not None:
+        s.incr(key, n)
+
+def bind(fn: Callable) -> Callable:
+    """스레드풀에 넘길 함수가 현재 span 아래로 기록되도록 context 를 복사"""
+    ctx = contextvars.copy_context()
+    return lambda *a, **k: ctx.run(fn, *a, **k)
+
+# ---------------------------
+# Sinks
+# ---------------------------
+class MemorySink:
+    """
+    마지막 요청(루트 span 이름별)의 span 목록 보관 (Streamlit 디버그 패널용).
+    루트에 background=True 가 붙은 trace (prefetch 등)는 이름별로만 보관하고 latest 는 안 바꿈.
+    """
+
+    def __init__(self):
+        self.last: Dict[str, List[Dict]] = {}
+        self.latest: List[Dict] = []
+        self.background: set = set()
+
+    def __call__(self, spans: List[Dict]):
+        root = next((s for s in spans if s["parent_id"] is None), None)
+        if root is None:
+            return
+        ordered = sorted(spans, key=lambda s: s["offset_ms"])
+        self.last[root["name"]] = ordered
+        if root["attrs"].get("background"):
+            self.background.add(root["name"])
+        else:
+            self.latest = ordered
+
+    def request_names(self) -> List[str]:
+        """사용자 요청 trace 먼저, background trace 는 뒤로"""
+        names = sorted(self.last)
+        return [n for n in names if n not in self.background] + [n for n in names if n in self.background]
+
+class JsonlSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, spans: List[Dict]):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+
+memory_sink = MemorySink()
+_sinks: List[Callable] = [memory_sink] + ([JsonlSink(TRACE_PATH)] if TRACE_PATH else [])
+
+def add_sink(sink: Callable):
+    _sinks.append(sink)
+
+def set_sinks(sinks: List[Callable]):
+    _sinks[:] = list(sinks)
+
+def _emit(spans: List[Dict]):
+    for sink in list(_sinks):
+        try:
+            sink(spans)
+        except Exception:
+            pass
+
+def last_trace(name: Optional[str] = None) -> List[Dict]:
+    return memory_sink.last.get(name, []) if name else memory_sink.latest
@@ -1,13 +1,7 @@
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
+# vectorstore.py
+# 예전 진입점 호환용. 모델/스토어는 resources 레지스트리의 것을 같이 씀 (k=5 리트리버만 따로)
+import resources
 
-embedding = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-)
-
-vectorstore = Chroma(
-    persist_directory="./chroma_db",
-    embedding_function=embedding
-)
-
-retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+embedding = resources.get_embedding()
+vectorstore = resources.get_vectorstore()
+retriever = resources.get_retriever(k=5)
@@ -0,0 +1,155 @@
+# workload.py
+# 레시피 코퍼스에서 재현 가능한 합성 쿼리 스트림 생성 (벤치마크/튜닝용)
+#   python workload.py -n 100000 --dist zipf --seed 7 -o queries.jsonl
+#   python workload.py -n 500 --source index      # 인덱스(recipe_docs.sqlite) 메타데이터 사용
+import argparse
+import itertools
+import json
+import random
+import sqlite3
+import sys
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+from ingredient_index import parse_ingredient_text
+
+CSV_PATH = "final_preview.csv"
+DISTRIBUTIONS = ["uniform", "zipf", "empirical"]
+
+STORY_TEMPLATES = [
+    "오늘 집밥 먹고 싶다",
+    "퇴근하고 너무 지쳤어",
+    "냉장고 정리 좀 하고 싶어",
+    "손님이 와서 근사하게 차리고 싶어",
+    "다이어트 중인데 뭐 먹지",
+    "혼자 한 잔 하고 싶은 밤",
+]
+
+QUERY_TEMPLATES = [
+    "{ings}(으)로 만들 수 있는 {style} 요리 추천해줘",
+    "{ings} 있는데 {method} 요리 뭐가 좋을까?",
+    "{story}. {ings} 있어",
+    "{style} 느낌으로 {ings} 요리 먹고 싶어",
+]
+
+# ---------------------------
+# Frequency tables
+# ---------------------------
+def _split_category(text: str) -> List[str]:
+    return [t.strip() for t in str(text or "").replace("/", ",").split(",") if t.strip()]
+
+def tables_from_csv(path: str = CSV_PATH) -> Dict[str, Counter]:
+    import pandas as pd
+    df = pd.read_csv(path, usecols=["재료내용", "상황별분류", "조리방법"])
+    ings, styles, methods = Counter(), Counter(), Counter()
+    for ing_text, situation, method in df.itertuples(index=False):
+        ings.update(parse_ingredient_text("" if pd.isna(ing_text) else ing_text))
+        styles.update(_split_category("" if pd.isna(situation) else situation))
+        methods.update(_split_category("" if pd.isna(method) else method))
+    return {"ingredients": ings, "styles": styles, "methods": methods}
+
+def tables_from_index(path: str = None) -> Dict[str, Counter]:
+    from recipe_store import RECIPE_STORE_PATH
+    conn = sqlite3.connect(f"file:{path or RECIPE_STORE_PATH}?mode=ro", uri=True)
+    ings, styles, methods = Counter(), Counter(), Counter()
+    for (md_json,) in conn.execute("SELECT metadata FROM recipe"):
+        md = json.loads(md_json)
+        ings.update(t for t in str(md.get("ingredients", "")).split(",") if t)
+        styles.update(_split_category(md.get("situation", "")))
+        methods.update(_split_category(md.get("method", "")))
+    conn.close()
+    return {"ingredients": ings, "styles": styles, "methods": methods}
+
+# ---------------------------
+# Samplers
+# ---------------------------
+def make_sampler(counter: Counter, dist: str = "zipf", zipf_s: float = 1.1) -> Tuple[List[str], List[float]]:
+    """(items, cum_weights). 인기 순으로 정렬해서 zipf 는 rank 기반 1/r^s."""
+    items = [k for k, _ in counter.most_common()]
+    if not items:
+        return [], []
+    if dist == "uniform":
+        weights = [1.0] * len(items)
+    elif dist == "empirical":
+        weights = [float(counter[k]) for k in items]
+    else:
+        weights = [1.0 / (r ** zipf_s) for r in range(1, len(items) + 1)]
+    return items, list(itertools.accumulate(weights))
+
+def _draw(rng: random.Random, sampler, k: int = 1) -> List[str]:
+    items, cum = sampler
+    if not items:
+        return []
+    out = []
+    # 같은 재료가 두 번 나오지 않게 몇 번만 다시 뽑음
+    for _ in range(k * 4):
+        x = rng.choices(items, cum_weights=cum)[0]
+        if x not in out:
+            out.append(x)
+        if len(out) >= k:
+            break
+    return out
+
+def generate(tables: Dict[str, Counter], n: int, seed: int = 0, dist: str = "zipf",
+             zipf_s: float = 1.1, max_ings: int = 3, empty_ing_ratio: float = 0.1) -> Iterator[Dict]:
+    """SCENARIOS 와 같은 모양의 쿼리를 n 개 스트리밍 (같은 seed 면 같은 결과)."""
+    rng = random.Random(seed)
+    ing_s = make_sampler(tables["ingredients"], dist, zipf_s)
+    style_s = make_sampler(tables["styles"], dist, zipf_s)
+    method_s = make_sampler(tables["methods"], dist, zipf_s)
+
+    for i in range(n):
+        ings = [] if rng.random() < empty_ing_ratio else _draw(rng, ing_s, rng.randint(1, max_ings))
+        style = (_draw(rng, style_s) or [""])[0]
+        method = (_draw(rng, method_s) or [""])[0]
+        story = rng.choice(STORY_TEMPLATES)
+        query = rng.choice(QUERY_TEMPLATES).format(
+            ings=", ".join(ings) or "아무 재료", style=style or "간단한",
+            method=method or "간단한", story=story
+        )
+        yield {
+            "name": f"W{seed}_{i:07d}",
+            "query": query,
+            "ingredients": ", ".join(ings),
+            "style": style,
+            "story": story,
+        }
+
+def write_jsonl(rows: Iterator[Dict], out) -> int:
+    n = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=1000, help="생성할 쿼리 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dist", choices=DISTRIBUTIONS, default="zipf")
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--source", choices=["csv", "index"], default="csv")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("-o", "--out", default="-", help="JSONL 출력 경로 (- 는 stdout)")
+    args = parser.parse_args()
+
+    tables = tables_from_csv(args.csv) if args.source == "csv" else tables_from_index()
+    print(f"ingredients={len(tables['ingredients'])} styles={len(tables['styles'])} "
+          f"methods={len(tables['methods'])}", file=sys.stderr)
+
+    rows = generate(tables, args.n, seed=args.seed, dist=args.dist, zipf_s=args.zipf_s)
+    if args.out == "-":
+        n = write_jsonl(rows, sys.stdout)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            n = write_jsonl(rows, f)
+    print(f"wrote {n} queries", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()